@@ -0,0 +1,109 @@
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+from screen_capture import IMAGE_MAX_EDGE, screen_frame_to_image
+
+# Compares the old PIL BGRX decode with screen_capture.screen_frame_to_image on synthetic mss-style
+# buffers. Each case runs in its own process so peak memory is not hidden by earlier cases.
+RESOLUTIONS = {
+    "1080p": (1920, 1080),
+    "1440p": (2560, 1440),
+    "4K": (3840, 2160),
+}
+METHODS = ("pil", "numpy")
+
+
+def peak_memory_bytes():
+    """Returns this process's peak resident memory. PIL allocations are invisible to tracemalloc."""
+    if sys.platform == "win32":
+        import ctypes
+        from ctypes import wintypes
+
+        class ProcessMemoryCounters(ctypes.Structure):
+            _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD)] + [
+                (name, ctypes.c_size_t) for name in (
+                    "PeakWorkingSetSize", "WorkingSetSize", "QuotaPeakPagedPoolUsage",
+                    "QuotaPagedPoolUsage", "QuotaPeakNonPagedPoolUsage", "QuotaNonPagedPoolUsage",
+                    "PagefileUsage", "PeakPagefileUsage")]
+
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        ctypes.windll.psapi.GetProcessMemoryInfo(
+            ctypes.windll.kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb)
+        return counters.PeakWorkingSetSize
+
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def synthetic_frame(width, height):
+    """Builds a BGRA bytearray like mss's ScreenShot.raw without a full-size temporary."""
+    raw = bytearray(width * height * 4)
+    pixels = np.frombuffer(raw, dtype=np.uint8)
+    pixels[::7] = 200
+    pixels[::13] = 40
+    pixels[3::4] = 255
+    return raw
+
+
+def convert_pil(raw, width, height):
+    # The previous path: ScreenShot.bgra copies the buffer, then PIL decodes it at full size
+    return Image.frombytes("RGB", (width, height), bytes(raw), "raw", "BGRX")
+
+
+def convert_numpy(raw, width, height):
+    return screen_frame_to_image(raw, width, height)
+
+
+def run_case(method, resolution, runs):
+    width, height = RESOLUTIONS[resolution]
+    convert = convert_pil if method == "pil" else convert_numpy
+    raw = synthetic_frame(width, height)
+    baseline = peak_memory_bytes()
+
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        image = convert(raw, width, height)
+        # Both paths end at the size prepare_image would send
+        scale = IMAGE_MAX_EDGE / max(image.size)
+        if scale < 1:
+            image = image.resize((round(image.width * scale), round(image.height * scale)), Image.LANCZOS)
+        timings.append(time.perf_counter() - start)
+        del image
+
+    return {
+        "median_ms": statistics.median(timings) * 1000,
+        "peak_mb": (peak_memory_bytes() - baseline) / (1024 * 1024),
+    }
+
+
+def main_bench(runs):
+    print(f"{'resolution':<12}{'method':<8}{'median ms':>12}{'extra peak MB':>16}")
+    for resolution in RESOLUTIONS:
+        for method in METHODS:
+            result = subprocess.run(
+                [sys.executable, __file__, "--case", method, resolution, "--runs", str(runs)],
+                capture_output=True, text=True, check=True)
+            stats = json.loads(result.stdout.strip().splitlines()[-1])
+            print(f"{resolution:<12}{method:<8}{stats['median_ms']:>12.1f}{stats['peak_mb']:>16.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark screenshot BGRA to RGB conversion.")
+    parser.add_argument("--runs", type=int, default=20, help="Conversions timed per case")
+    parser.add_argument("--case", nargs=2, metavar=("METHOD", "RESOLUTION"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        print(json.dumps(run_case(*args.case, args.runs)))
+    else:
+        main_bench(args.runs)
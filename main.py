@@ -1,20 +1,42 @@
 import os
+import re
 import time
 import sys
+import io
+import json
+import hashlib
+import threading
+import queue
+import functools
+import inspect
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque, OrderedDict
 from dotenv import load_dotenv
 
 import cv2  # For webcam access
 import mss  # For screen capture
+import numpy as np
 from PIL import Image  # For image manipulation
+from screen_capture import IMAGE_MAX_EDGE, screen_frame_to_image
 
 # Selenium imports for your new STT
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
+from selenium.common.exceptions import WebDriverException
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.ui import WebDriverWait
 from webdriver_manager.chrome import ChromeDriverManager
 
+# Local offline STT
+import sounddevice as sd
+import vosk
+
+# Voice activity detection for barge-in
+import torch
+from silero_vad import load_silero_vad, VADIterator
+
 # Gemini API
 import google.generativeai as genai
 from google.genai import types
@@ -23,8 +45,8 @@ from google.genai import types
 import edge_tts
 import asyncio
 
-# Pygame for audio playback
-import pygame
+# MP3 decoding for TTS playback
+import miniaudio
 
 # NEW IMPORTS for new tools
 import pyautogui
@@ -51,8 +73,72 @@ MAX_HISTORY_LENGTH = 20  # Max turns to keep in memory for immediate context
 
 # TTS Constants
 VOICE = "en-US-JennyNeural"
-# Not directly used in current play_audio, but good to keep if streaming was implemented.
-BUFFER_SIZE = 1024
+BUFFER_SIZE = 1024  # PCM frames decoded per block when streaming TTS audio
+TTS_SAMPLE_RATE = 24000  # edge_tts streams 24kHz mono MP3
+JITTER_BUFFER_BYTES = 3000  # About 0.5s of 48kbps MP3 buffered before playback starts
+TTS_PREFETCH_DEPTH = 2  # Sentences synthesized ahead of the one playing
+MIN_SENTENCE_CHARS = 20  # Shorter sentences are merged with the next one
+MAX_SENTENCE_CHARS = 200  # Longer sentences are split at clause boundaries
+TTS_RATE = "+0%"  # edge_tts speaking rate
+TTS_CACHE_DIR = "tts_cache"  # Holds only the synthesized STATIC_PHRASES
+TTS_CACHE_MEMORY_BYTES = 8 * 1024 * 1024
+TTS_CACHE_DISK_BYTES = 64 * 1024 * 1024
+TTS_CACHE_DISK_LOW_WATER = 48 * 1024 * 1024  # Disk eviction frees space down to this
+# Fixed phrases spoken by the conversation loop, synthesized into the cache at startup
+STATIC_PHRASES = [
+    "Hello! How can I assist you today!",
+    "Goodbye!",
+    "I'm sorry, I couldn't generate a response.",
+    "I'm sorry, I encountered an error. Please try again.",
+    "I performed the requested action successfully, but I have no further details to add.",
+    "I performed an action, but there was no direct response.",
+]
+
+# Vision Constants
+CAMERA_INDEX = 0  # 0 is typically the default webcam
+CAMERA_IDLE_TIMEOUT = 60  # Seconds without requests before the webcam is released
+CAMERA_WARMUP_SECONDS = 1.0  # Frames are discarded this long after opening so auto-exposure can settle
+GUIDE_SAMPLE_INTERVAL = 0.5  # Seconds between webcam frames checked in guide mode
+GUIDE_CHANGE_THRESHOLD = 0.2  # Fraction of the view that must change before it is described again
+GUIDE_MIN_INTERVAL = 5.0  # Minimum seconds between guide mode descriptions
+GUIDE_SIGNATURE_SIZE = (160, 120)  # Grayscale thumbnail used to score scene changes
+GUIDE_PIXEL_THRESHOLD = 25  # Brightness difference for a thumbnail pixel to count as changed
+JPEG_QUALITY = 80  # Used for photographic content such as webcam frames
+WEBP_QUALITY = 90  # Used for screen-like content, keeps text legible
+SCREEN_LIKE_MAX_COLORS = 1500  # Fewer distinct colors in a 64x64 sample than this means UI or text
+SCREEN_CAPTURE_TARGETS = ("monitor", "primary", "window", "all")
+DEFAULT_SCREEN_TARGET = "monitor"  # The monitor under the mouse cursor
+SCREEN_HASH_SIZE = 16  # dHash grid edge; 16 gives a 256-bit hash
+SCREEN_CACHE_MAX_DISTANCE = 6  # Differing hash bits still treated as the same screen
+SCREEN_CACHE_TTL = 30  # Seconds a screen description can be reused
+SCREEN_CACHE_MAX_ENTRIES = 32
+SCREEN_TILE_SIZE = 64  # Tile edge in pixels when diffing frames
+SCREEN_PIXEL_THRESHOLD = 24  # Channel difference for a pixel to count as changed
+SCREEN_TILE_MIN_PIXELS = 8  # Changed pixels needed to mark a tile, ignores dithering and blinking carets
+SCREEN_MAX_CHANGE_REGIONS = 4  # More separate regions than this are merged into one
+SCREEN_FULL_CHANGE_FRACTION = 0.5  # Above this fraction of changed tiles the whole screen is sent
+SCREEN_OVERVIEW_EDGE = 512  # Longest edge of the overview thumbnail sent with changed regions
+
+# Tool Execution Constants
+CAPTURE_WORKERS = 2  # Threads for webcam and screen capture and image encoding
+TOOL_WORKERS = 4  # Threads for blocking network and automation calls made by tools
+MODEL_REQUEST_TIMEOUT = 20  # Seconds before a Gemini request made by a tool is abandoned
+TOOL_TIMEOUT = 30  # Default seconds a tool may run before it is cancelled
+# Tool parameters filled in by the dispatcher rather than by Gemini
+INJECTED_PARAMETERS = ("user_query",)
+GEMINI_TYPES = {str: "STRING", int: "INTEGER", float: "NUMBER", bool: "BOOLEAN"}
+
+# STT Constants
+STT_SAMPLE_RATE = 16000  # Hertz, same rate as the VAD pipeline in vad-stt.py
+STT_BLOCK_SIZE = 1600    # Samples per block fed to the recognizer (100ms at 16kHz)
+VAD_WINDOW_SIZE = 512    # Samples per Silero VAD window (32ms at 16kHz)
+BARGE_IN_THRESHOLD = 0.7  # Speech probability needed to interrupt playback
+BARGE_IN_MIN_SPEECH_MS = 250  # How long the user must speak before playback is cut off
+BARGE_IN_ECHO_MARGIN = 2.0  # With speakers, mic RMS must exceed the measured echo of the output by this factor
+BARGE_IN_ECHO_ADAPT = 0.05  # How quickly the measured echo follows changes in speaker volume
+BARGE_IN_PRE_ROLL_MS = 500  # Audio from before speech was confirmed that is handed to the STT backend
+OUTPUT_LEVEL_HALF_LIFE = 0.1  # Seconds; the output level decays slowly so it still covers delayed echo
+OUTPUT_SILENCE_LEVEL = 0.005  # Output level below which playback and its echo count as finished
 
 # --- Configuration ---
 load_dotenv()
@@ -65,6 +151,17 @@ if not GOOGLE_API_KEY:
 
 genai.configure(api_key=GOOGLE_API_KEY)
 
+# Which speech-to-text backend to use: "local" (offline Vosk), "web" (Selenium) or "keyboard".
+STT_BACKEND = os.getenv("STT_BACKEND", "local")
+# Optional path to an unpacked Vosk model. If unset, Vosk downloads its small English model.
+VOSK_MODEL_PATH = os.getenv("VOSK_MODEL_PATH")
+# Set BARGE_IN=1 to interrupt speech by talking over it. Needs headphones: without echo
+# cancellation the mic hears the assistant's own voice through the speakers.
+BARGE_IN_ENABLED = os.getenv("BARGE_IN", "0") == "1"
+# Set BARGE_IN_SPEAKERS=1 to try barge-in without headphones. Speech then only counts when it
+# is clearly louder than the echo of the assistant's voice measured at the mic.
+BARGE_IN_SPEAKERS = os.getenv("BARGE_IN_SPEAKERS", "0") == "1"
+
 # --- Initialize Gemini Model (SINGLE INSTANCE) ---
 SYSTEM_PROMPT = """
 <purpose>
@@ -109,6 +206,143 @@ model = genai.GenerativeModel(
 
 # --- Helper Functions ---
 
+# Blocking tool work runs on these pools so audio output and listening keep going meanwhile
+capture_pool = ThreadPoolExecutor(max_workers=CAPTURE_WORKERS, thread_name_prefix="capture")
+tool_pool = ThreadPoolExecutor(max_workers=TOOL_WORKERS, thread_name_prefix="tool")
+
+
+async def run_blocking(func, *args, pool=tool_pool, timeout=None, **kwargs):
+    """Runs a blocking call on a worker pool and waits for it without stalling the event loop.
+
+    Raises asyncio.TimeoutError after timeout seconds. A timed out or cancelled call stops being
+    waited for at once, but its worker thread still finishes the call, as threads cannot be
+    interrupted.
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(pool, functools.partial(func, *args, **kwargs))
+    return await asyncio.wait_for(future, timeout)
+
+
+def parse_tool_docstring(docstring: str):
+    """Splits a tool docstring into its description and a {parameter: description} dict from its Args section."""
+    description_lines = []
+    parameters = {}
+    section = None
+    current = None
+    entry_indent = None
+    for line in inspect.cleandoc(docstring or "").splitlines():
+        stripped = line.strip()
+        if stripped in ("Args:", "Returns:"):
+            section = stripped
+            continue
+        if section is None:
+            if stripped:
+                description_lines.append(stripped)
+        elif section == "Args:" and stripped:
+            indent = len(line) - len(line.lstrip())
+            match = re.match(r"(\w+):\s*(.*)", stripped)
+            if match and (entry_indent is None or indent <= entry_indent):
+                entry_indent = indent
+                current = match.group(1)
+                parameters[current] = match.group(2)
+            elif current:
+                parameters[current] += " " + stripped
+    return " ".join(description_lines), parameters
+
+
+class ToolSpec:
+    """Everything the dispatcher needs to know about one tool, worked out once when it is registered.
+
+    Parameters named in INJECTED_PARAMETERS are supplied by the dispatcher from the conversation
+    and are left out of the declaration Gemini sees.
+    """
+
+    def __init__(self, function, timeout: float, parallel_safe: bool):
+        signature = inspect.signature(function)
+        self.name = function.__name__
+        self.function = function
+        self.is_async = asyncio.iscoroutinefunction(function)
+        self.timeout = timeout
+        self.parallel_safe = parallel_safe
+        self.injected = tuple(name for name in signature.parameters if name in INJECTED_PARAMETERS)
+        self.description, parameter_docs = parse_tool_docstring(function.__doc__)
+        self.parameters = {}
+        self.required = []
+        for name, parameter in signature.parameters.items():
+            if name in self.injected:
+                continue
+            schema = {"type": GEMINI_TYPES.get(parameter.annotation, "STRING")}
+            if parameter_docs.get(name):
+                schema["description"] = parameter_docs[name]
+            self.parameters[name] = schema
+            if parameter.default is inspect.Parameter.empty:
+                self.required.append(name)
+
+    def bind(self, args: dict, **context) -> dict:
+        """Returns the keyword arguments for a call from Gemini's args and the injected context.
+
+        Arguments the tool does not declare are dropped, and whole-number floats are converted
+        for INTEGER parameters, since Gemini sends every number as a float.
+        """
+        call_args = {}
+        for name, value in args.items():
+            schema = self.parameters.get(name)
+            if schema is None:
+                continue
+            if schema["type"] == "INTEGER" and isinstance(value, float):
+                value = int(value)
+            call_args[name] = value
+        for name in self.injected:
+            call_args[name] = context.get(name)
+        return call_args
+
+    def declaration(self) -> dict:
+        declaration = {"name": self.name, "description": self.description}
+        if self.parameters:
+            declaration["parameters"] = {"type": "OBJECT", "properties": self.parameters}
+            if self.required:
+                declaration["parameters"]["required"] = self.required
+        return declaration
+
+
+class ToolRegistry:
+    """The tools Gemini can call, indexed by name.
+
+    Tools join with the register() decorator, so dispatch is a dict lookup. The function
+    declarations sent to Gemini are built from the same specs, which means a tool is described
+    in one place, its signature and docstring.
+    """
+
+    def __init__(self):
+        self.tools = {}
+        self._declarations = None
+
+    def register(self, timeout: float = TOOL_TIMEOUT, parallel_safe: bool = False):
+        """Decorator that registers a tool and returns it unchanged.
+
+        parallel_safe tools only read state and may run at the same time as other calls in a turn.
+        """
+        def decorator(function):
+            self.tools[function.__name__] = ToolSpec(function, timeout, parallel_safe)
+            self._declarations = None
+            return function
+        return decorator
+
+    def get(self, name: str):
+        return self.tools.get(name)
+
+    @property
+    def declarations(self) -> list:
+        """The tools argument for generate_content, cached until the next registration."""
+        if self._declarations is None:
+            self._declarations = [
+                {"function_declarations": [spec.declaration() for spec in self.tools.values()]}]
+        return self._declarations
+
+
+tool_registry = ToolRegistry()
+
+
 
 def log_message(content: str, sender: str = None):
     """Appends a timestamped message to the conversation log file."""
@@ -129,7 +363,7 @@ async def summarize_conversation_log(current_log_content: str) -> str:
         f"\n\nConversation:\n{current_log_content}"
     )
     try:
-        summary_response = await model.generate_content(
+        summary_response = await model.generate_content_async(
             summary_prompt,
             generation_config=genai.GenerationConfig(
                 temperature=0.0, max_output_tokens=2000)  # Max tokens for summary
@@ -144,22 +378,28 @@ async def summarize_conversation_log(current_log_content: str) -> str:
 
 
 # --- Gmail API Functions ---
+# Gmail tools can run at the same time, but only one may refresh credentials, rewrite
+# token.json or run the OAuth consent flow
+gmail_auth_lock = threading.Lock()
+
+
 def get_gmail_service():
     """Shows basic usage of the Gmail API.
     Lists the user's Gmail labels.
     """
-    creds = None
-    if os.path.exists('token.json'):
-        creds = Credentials.from_authorized_user_file('token.json', SCOPES)
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-        else:
-            flow = InstalledAppFlow.from_client_secrets_file(
-                'credentials.json', SCOPES)
-            creds = flow.run_local_server(port=0)
-        with open('token.json', 'w') as token:
-            token.write(creds.to_json())
+    with gmail_auth_lock:
+        creds = None
+        if os.path.exists('token.json'):
+            creds = Credentials.from_authorized_user_file('token.json', SCOPES)
+        if not creds or not creds.valid:
+            if creds and creds.expired and creds.refresh_token:
+                creds.refresh(Request())
+            else:
+                flow = InstalledAppFlow.from_client_secrets_file(
+                    'credentials.json', SCOPES)
+                creds = flow.run_local_server(port=0)
+            with open('token.json', 'w') as token:
+                token.write(creds.to_json())
 
     try:
         service = build('gmail', 'v1', credentials=creds)
@@ -169,6 +409,7 @@ def get_gmail_service():
         return None
 
 
+@tool_registry.register(timeout=120)  # May wait for the OAuth consent flow in the browser
 def send_gmail_message(recipient_name: str, subject: str, message_text: str) -> str:
     """
     Sends an email message using the Gmail API.
@@ -215,6 +456,7 @@ def send_gmail_message(recipient_name: str, subject: str, message_text: str) ->
         return f'An unexpected error occurred: {str(e)}'
 
 
+@tool_registry.register(timeout=120, parallel_safe=True)
 def read_gmail_messages(max_results: int = 5) -> str:
     """
     Retrieves the latest emails from the user's Gmail inbox.
@@ -266,18 +508,201 @@ def read_gmail_messages(max_results: int = 5) -> str:
         return f'An unexpected error occurred: {str(e)}'
 
 
-# --- Speech-to-Text Listener Class ---
-class SpeechToTextListener:
-    """A class for performing speech-to-text using a web-based service."""
+# --- Speech-to-Text Backends ---
+class STTBackend(ABC):
+    """Base interface for the speech-to-text engines used by the conversation loop.
+
+    Backends implement `transcripts()` as an async generator of (text, is_final) tuples.
+    Partial transcripts are shown as they arrive; `listen()` returns the first non-empty final one.
+    """
+
+    listening = False  # True while listen() is running
+    carryover = b""  # Speech recorded by the barge-in monitor before listen() started
+
+    def stream(self, content: str):
+        """Prints the given content to the console with a yellow color, overwriting previous output, with "speaking..." added."""
+        print("\033[96m\rUser Speaking: \033[93m" +
+              f" {content}", end='', flush=True)
+
+    @abstractmethod
+    def transcripts(self):
+        """Async generator of (text, is_final) tuples from the microphone or other input."""
+
+    async def listen(self, prints: bool = False):
+        """Waits for the next complete utterance and returns its text, or None on error."""
+        # Backends that cannot take raw audio simply drop it
+        self.carryover = barge_in_monitor.take_audio() if barge_in_monitor else b""
+        self.listening = True
+        transcripts = self.transcripts()
+        try:
+            async for text, is_final in transcripts:
+                if not is_final:
+                    self.stream(text)
+                    continue
+                if text and len(text.strip()) > 0:
+                    print("\r" + " " * (len(text) + 25) + "\r", end="", flush=True)
+                    if prints:
+                        print("\033[92m\rYOU SAID: " + f"{text}\033[0m\n")
+                    return text
+        except Exception as e:
+            print(f"\n\033[91mError in STT listener: {e}\033[0m")
+            return None
+        finally:
+            self.listening = False
+            await transcripts.aclose()
+        return None
+
+    def close(self):
+        pass
+
+
+class LocalSTTBackend(STTBackend):
+    """Offline streaming speech-to-text using Vosk, fed by a sounddevice microphone stream."""
+
+    def __init__(
+            self,
+            model_path: str = VOSK_MODEL_PATH,
+            sample_rate: int = STT_SAMPLE_RATE,
+            block_size: int = STT_BLOCK_SIZE):
+        self.sample_rate = sample_rate
+        self.block_size = block_size
+        vosk.SetLogLevel(-1)
+        self.model = vosk.Model(model_path) if model_path else vosk.Model(lang="en-us")
+
+    def _decode_blocks(self, blocks: queue.Queue, loop, results: asyncio.Queue):
+        """Runs the recognizer on a worker thread so decoding never blocks the event loop."""
+        recognizer = vosk.KaldiRecognizer(self.model, self.sample_rate)
+        last_partial = ""
+        while True:
+            data = blocks.get()
+            if data is None:
+                break
+            if recognizer.AcceptWaveform(data):
+                text = json.loads(recognizer.Result()).get("text", "")
+                last_partial = ""
+                loop.call_soon_threadsafe(results.put_nowait, (text, True))
+            else:
+                partial = json.loads(recognizer.PartialResult()).get("partial", "")
+                if partial and partial != last_partial:
+                    last_partial = partial
+                    loop.call_soon_threadsafe(results.put_nowait, (partial, False))
+
+    async def transcripts(self):
+        loop = asyncio.get_running_loop()
+        blocks = queue.Queue()
+        results = asyncio.Queue()
+        # Enough recent audio to cover a barge-in from speech onset until playback is cut off
+        held = deque(maxlen=int((BARGE_IN_PRE_ROLL_MS + BARGE_IN_MIN_SPEECH_MS) * self.sample_rate / 1000)
+                     // self.block_size + 2)
+        held_generation = None
+
+        def audio_callback(indata, frames, time_info, status):
+            nonlocal held_generation
+            if status:
+                print(f"Stream status: {status}", flush=True)
+            # Without echo cancellation the mic hears our own speech, such as guide mode
+            # narration, so nothing is transcribed while it is playing. The last moments are
+            # held back instead, in case the user talks over it.
+            if audio_output.playing:
+                if held_generation is None:
+                    held_generation = audio_output.generation
+                held.append(bytes(indata))
+                return
+            if held_generation is not None and audio_output.generation != held_generation:
+                # Playback was cut off, so what was held is the start of the user's barge-in
+                for block in held:
+                    blocks.put(block)
+            held.clear()
+            held_generation = None
+            blocks.put(bytes(indata))
+
+        if self.carryover:
+            # The start of an utterance that interrupted playback, recorded by the barge-in monitor
+            blocks.put(self.carryover)
+            self.carryover = b""
+        decoder = threading.Thread(
+            target=self._decode_blocks, args=(blocks, loop, results), daemon=True)
+        decoder.start()
+        try:
+            with sd.RawInputStream(samplerate=self.sample_rate,
+                                   blocksize=self.block_size,
+                                   dtype='int16',
+                                   channels=1,
+                                   callback=audio_callback):
+                print("\033[94m\rListening...", end='', flush=True)
+                while True:
+                    yield await results.get()
+        finally:
+            blocks.put(None)
+
+
+class KeyboardInputBackend(STTBackend):
+    """Reads typed input instead of speech, for testing without a microphone."""
+
+    async def transcripts(self):
+        while True:
+            yield await asyncio.to_thread(input, ">>> "), True
+
+
+class SpeechToTextListener(STTBackend):
+    """A class for performing speech-to-text using a web-based service.
+
+    The page records from the microphone on its own, so unlike LocalSTTBackend it is not muted
+    while speech plays. Guide mode narration from speakers can be transcribed as user input.
+    """
+
+    # Observes convert_text and is_recording and queues their changes on the page,
+    # so transcripts are pushed to us instead of being polled element by element.
+    BRIDGE_SCRIPT = """
+    if (!window.__drishtiEvents) {
+        window.__drishtiEvents = [];
+        window.__drishtiWaiter = null;
+        [['convert_text', 'text'], ['is_recording', 'recording']].forEach(function (pair) {
+            var el = document.getElementById(pair[0]);
+            if (!el) { return; }
+            new MutationObserver(function () {
+                window.__drishtiEvents.push({kind: pair[1], text: el.innerText || el.textContent || ''});
+                if (window.__drishtiWaiter) {
+                    var wake = window.__drishtiWaiter;
+                    window.__drishtiWaiter = null;
+                    wake();
+                }
+            }).observe(el, {childList: true, characterData: true, subtree: true});
+        });
+    }
+    """
+
+    # Resolves with every queued event as soon as one is available, or with an empty
+    # batch after the timeout. Resolves with null if the bridge is gone (page reloaded).
+    READ_EVENTS_SCRIPT = """
+    var done = arguments[arguments.length - 1];
+    var timeoutMs = arguments[0];
+    if (!window.__drishtiEvents) { done(null); return; }
+    function flush() {
+        var batch = window.__drishtiEvents;
+        window.__drishtiEvents = [];
+        done(batch);
+    }
+    if (window.__drishtiEvents.length) { flush(); return; }
+    var timer = setTimeout(function () { window.__drishtiWaiter = null; flush(); }, timeoutMs);
+    window.__drishtiWaiter = function () { clearTimeout(timer); setTimeout(flush, 0); };
+    """
 
     def __init__(
             self,
             website_path: str = "https://realtime-stt-devs-do-code.netlify.app/",
             language: str = "en-US",
-            wait_time: int = 10):
-        """Initializes the STT class with the given website path and language."""
+            wait_time: int = 10,
+            warm_session: bool = True):
+        """Initializes the STT class with the given website path and language.
+
+        With warm_session the page is loaded and the language set once, and each utterance
+        only arms and disarms recording. The page is reloaded only if it stops responding.
+        """
         self.website_path = website_path
         self.language = language
+        self.warm_session = warm_session
+        self.session_ready = False
         self.chrome_options = Options()
         self.chrome_options.add_argument("--use-fake-ui-for-media-stream")
         self.chrome_options.add_argument(
@@ -286,14 +711,10 @@ class SpeechToTextListener:
         self.driver = webdriver.Chrome(service=webdriver.ChromeService(
             ChromeDriverManager().install()), options=self.chrome_options)
         self.wait = WebDriverWait(self.driver, wait_time)
+        self.driver.set_script_timeout(wait_time)
         self.last_stt_text = ""  # Corrected: Initialized once here
         print("Made By ❤️ @DevsDoCode")
 
-    def stream(self, content: str):
-        """Prints the given content to the console with a yellow color, overwriting previous output, with "speaking..." added."""
-        print("\033[96m\rUser Speaking: \033[93m" +
-              f" {content}", end='', flush=True)
-
     def get_text(self) -> str:
         """Retrieves the transcribed text from the website."""
         try:
@@ -319,8 +740,8 @@ class SpeechToTextListener:
             By.CSS_SELECTOR, "option:checked").get_attribute("value")
         return selected_language == self.language
 
-    def main_stt_process(self):
-        """Performs speech-to-text conversion and returns the transcribed text."""
+    def load_page(self) -> bool:
+        """Navigates to the STT page and selects the language. Returns False if the language could not be set."""
         self.driver.get(self.website_path)
 
         self.wait.until(EC.presence_of_element_located(
@@ -333,9 +754,79 @@ class SpeechToTextListener:
                 By.CSS_SELECTOR, "option:checked").get_attribute("value")
             print(
                 f"Error: Failed to select the correct language. Selected: {actual_selected}, Expected: {self.language}")
-            return None
+            return False
+        self.install_bridge()
+        return True
 
-        self.driver.find_element(By.ID, "click_to_record").click()
+    def install_bridge(self):
+        """Injects the MutationObserver bridge into the page. Safe to call more than once."""
+        self.driver.execute_script(self.BRIDGE_SCRIPT)
+
+    def read_events(self, timeout_ms: int = 500):
+        """Waits up to timeout_ms for page events and returns them as one batch.
+
+        Returns None if the bridge is missing, e.g. because the page was reloaded.
+        """
+        return self.driver.execute_async_script(self.READ_EVENTS_SCRIPT, timeout_ms)
+
+    def page_alive(self) -> bool:
+        """Checks that the STT page is still loaded and responding to scripts."""
+        try:
+            return bool(self.driver.execute_script(
+                "return document.readyState === 'complete' && !!document.getElementById('click_to_record');"))
+        except WebDriverException:
+            return False
+
+    def ensure_session(self) -> bool:
+        """Loads the page on first use, and reloads it only when the warm page has died."""
+        if self.session_ready and self.page_alive():
+            return True
+        if self.session_ready:
+            print("\033[93mSTT page stopped responding. Reloading...\033[0m")
+        self.session_ready = self.load_page()
+        return self.session_ready
+
+    def recording_active(self) -> bool:
+        """Returns True if the page reports that it is currently recording."""
+        return self.driver.find_element(By.ID, "is_recording").text.startswith("Recording: True")
+
+    def arm_recording(self):
+        """Clears the previous transcript and queued events, then starts recording on the loaded page."""
+        self.driver.execute_script(
+            "var el = document.getElementById('convert_text'); if (el) { el.innerHTML = ''; }"
+            "if (window.__drishtiEvents) { window.__drishtiEvents = []; }")
+        self.last_stt_text = ""
+        if not self.recording_active():
+            self.driver.find_element(By.ID, "click_to_record").click()
+
+    def disarm_recording(self):
+        """Stops recording between utterances without leaving the page."""
+        try:
+            if self.recording_active():
+                self.driver.find_element(By.ID, "click_to_record").click()
+        except WebDriverException:
+            self.session_ready = False
+
+    def main_stt_process(self, on_partial=None):
+        """Performs speech-to-text conversion and returns the transcribed text.
+
+        Partial transcripts are passed to on_partial as they arrive, or printed if it is None.
+        """
+        if not self.warm_session:
+            if not self.load_page():
+                return None
+            self.driver.find_element(By.ID, "click_to_record").click()
+        else:
+            if not self.ensure_session():
+                return None
+            try:
+                self.arm_recording()
+            except WebDriverException:
+                # The page died between the health check and arming; reload once and retry.
+                self.session_ready = False
+                if not self.ensure_session():
+                    return None
+                self.arm_recording()
 
         is_recording = self.wait.until(
             EC.presence_of_element_located((By.ID, "is_recording"))
@@ -347,41 +838,68 @@ class SpeechToTextListener:
         last_text_time = time.time()
         silence_timeout = 5  # seconds of silence to consider input finished
 
-        while is_recording.text.startswith("Recording: True") and (time.time() - start_time < max_listen_time):
-            text = self.get_text()
-            if text:
-                if text != self.last_stt_text:
+        recording = is_recording.text.startswith("Recording: True")
+        text = ""
+
+        while recording and (time.time() - start_time < max_listen_time):
+            events = self.read_events()
+            if events is None:
+                print("\n\033[93mSTT page bridge lost. Stopping listening.\033[0m", flush=True)
+                self.session_ready = False
+                break
+
+            for event in events:
+                if event["kind"] == "recording":
+                    recording = event["text"].startswith("Recording: True")
+                else:
+                    text = event["text"]
+
+            if text and text != self.last_stt_text:
+                if on_partial:
+                    on_partial(text)
+                else:
                     self.stream(text)
-                    self.last_stt_text = text
-                    last_text_time = time.time()
+                self.last_stt_text = text
+                last_text_time = time.time()
 
             if time.time() - last_text_time > silence_timeout and len(text.strip()) > 0:
                 print(
                     f"\n\033[94mDetected silence for {silence_timeout} seconds. Stopping listening.\033[0m", flush=True)
                 break
 
-            time.sleep(0.1)
-
         final_text = self.get_text()
-        print("\r" + " " * (len(final_text) + 25) + "\r", end="", flush=True)
+        if self.warm_session:
+            self.disarm_recording()
         return final_text
 
-    def listen(self, prints: bool = False):
-        # self.last_stt_text = "" # Removed: Initialized in __init__
-        try:
+    async def transcripts(self):
+        loop = asyncio.get_running_loop()
+        results = asyncio.Queue()
+
+        def on_partial(text):
+            loop.call_soon_threadsafe(results.put_nowait, (text, False))
+
+        def run_once():
+            final_text = None
+            try:
+                final_text = self.main_stt_process(on_partial)
+            finally:
+                loop.call_soon_threadsafe(results.put_nowait, (final_text, True))
+
+        while True:
+            worker = asyncio.ensure_future(asyncio.to_thread(run_once))
             while True:
-                result = self.main_stt_process()
-                if result and len(result.strip()) > 0:
-                    if prints:
-                        print("\033[92m\rYOU SAID: " + f"{result}\033[0m\n")
-                    return result
-                else:
-                    print(
-                        "\033[91mNo speech detected or recognized. Please try again.\033[0m")
-                    time.sleep(0.5)
-        except Exception as e:
-            print(f"\n\033[91mError in STT listener: {e}\033[0m")
-            return None
+                result, is_final = await results.get()
+                if is_final:
+                    break
+                yield result, False
+            await worker
+            if not result or len(result.strip()) == 0:
+                print(
+                    "\033[91mNo speech detected or recognized. Please try again.\033[0m")
+                await asyncio.sleep(0.5)
+                continue
+            yield result, True
 
     def close(self):
         if self.driver:
@@ -389,128 +907,1203 @@ class SpeechToTextListener:
             print("Selenium WebDriver for STT closed.")
 
 
+def create_stt_backend(name: str = STT_BACKEND) -> STTBackend:
+    """Creates the speech-to-text backend selected by the STT_BACKEND setting."""
+    if name == "local":
+        return LocalSTTBackend()
+    if name == "web":
+        return SpeechToTextListener()
+    if name == "keyboard":
+        return KeyboardInputBackend()
+    raise ValueError(f'Unknown STT backend "{name}". Use "local", "web" or "keyboard".')
+
+
 # Global instance of STT Listener
 stt_listener = None
 
 
-# --- Pygame-based TTS Function ---
-def remove_file(file_path):
-    max_attempts = 3
-    attempts = 0
-    while attempts < max_attempts:
+# --- TTS and Audio Output ---
+class AudioOutputService:
+    """Long-lived audio output that plays queued PCM buffers.
+
+    The output device is opened once and stays open. PCM written from any thread is played
+    in order, and drain() returns when everything queued so far has been handed to the device.
+    """
+
+    def __init__(self, sample_rate: int = TTS_SAMPLE_RATE):
+        self.sample_rate = sample_rate
+        self.buffers = deque()  # (bytes, on_done) pairs; on_done may be None
+        self.offset = 0  # Bytes of the front buffer already played
+        self.lock = threading.Lock()
+        self.stream = None
+        self.generation = 0  # Bumped by flush() so writers that were cut off can tell
+        self.level = 0.0  # Recent RMS of the audio being played, from 0.0 to 1.0
+
+    def start(self):
+        """Opens the output device if it is not open yet."""
+        with self.lock:
+            if self.stream is None:
+                self.stream = sd.RawOutputStream(samplerate=self.sample_rate, channels=1,
+                                                 dtype='int16', callback=self._callback)
+                self.stream.start()
+
+    def _callback(self, outdata, frames, time_info, status):
+        needed = len(outdata)
+        written = 0
+        with self.lock:
+            while self.buffers and written < needed:
+                data, on_done = self.buffers[0]
+                n = min(needed - written, len(data) - self.offset)
+                outdata[written:written + n] = data[self.offset:self.offset + n]
+                written += n
+                self.offset += n
+                if self.offset == len(data):
+                    self.buffers.popleft()
+                    self.offset = 0
+                    if on_done:
+                        on_done()
+        if written < needed:
+            outdata[written:] = b'\x00' * (needed - written)
+        samples = np.frombuffer(outdata, dtype=np.int16, count=written // 2).astype(np.float32)
+        block_level = float(np.sqrt(np.mean(samples ** 2))) / 32768 if len(samples) else 0.0
+        self.level = max(block_level, self.level * 0.5 ** (frames / self.sample_rate / OUTPUT_LEVEL_HALF_LIFE))
+
+    def write(self, pcm: bytes, on_done=None, generation=None):
+        """Queues 16-bit mono PCM for playback. Safe to call from any thread.
+
+        Writes tagged with a generation older than the current one are dropped.
+        """
+        self.start()
+        with self.lock:
+            if generation is None or generation == self.generation:
+                self.buffers.append((pcm, on_done))
+                return
+        if on_done:
+            on_done()
+
+    def drain(self, generation=None):
+        """Returns an awaitable that completes once everything queued so far has played or been flushed."""
+        loop = asyncio.get_running_loop()
+        done = loop.create_future()
+
+        def on_done():
+            loop.call_soon_threadsafe(lambda: done.done() or done.set_result(None))
+
+        self.write(b'', on_done, generation)
+        return done
+
+    def flush(self):
+        """Drops all queued audio at once, e.g. when the user interrupts. Pending drains complete."""
+        with self.lock:
+            pending = [on_done for _, on_done in self.buffers if on_done]
+            self.buffers.clear()
+            self.offset = 0
+            self.generation += 1
+        for on_done in pending:
+            on_done()
+
+    @property
+    def playing(self) -> bool:
+        """True while audio is queued or has only just finished, so its echo may still reach the mic."""
+        return bool(self.buffers) or self.level > OUTPUT_SILENCE_LEVEL
+
+    async def play(self, pcm: bytes):
+        """Plays PCM and waits until it has been played."""
+        self.write(pcm)
+        await self.drain()
+
+    def close(self):
+        with self.lock:
+            stream, self.stream = self.stream, None
+        # Closing waits for the callback thread, which needs the lock, so it must happen outside it
+        if stream is not None:
+            stream.close()
+
+
+audio_output = AudioOutputService()
+
+
+def decode_audio(data: bytes) -> bytes:
+    """Decodes a complete MP3 into 16-bit mono PCM at the output sample rate."""
+    decoded = miniaudio.decode(data, output_format=miniaudio.SampleFormat.SIGNED16,
+                               nchannels=1, sample_rate=TTS_SAMPLE_RATE)
+    return decoded.samples.tobytes()
+
+
+async def play_audio(data: bytes):
+    """Decodes a complete MP3 held in memory and plays it."""
+    print("\033[92mPlaying audio...\033[0m")
+    try:
+        await audio_output.play(decode_audio(data))
+    except Exception as e:
+        print(f"\033[91mError playing audio: {e}\033[0m")
+
+
+class MP3ChunkSource(miniaudio.StreamableSource):
+    """Feeds MP3 chunks to the miniaudio decoder as they arrive from edge_tts.
+
+    read() blocks only while no data is available and the stream has not finished.
+    """
+
+    def __init__(self):
+        self.data = bytearray()
+        self.position = 0
+        self.total_bytes = 0
+        self.finished = False
+        self.cancelled = False
+        self.condition = threading.Condition()
+
+    def feed(self, chunk: bytes):
+        with self.condition:
+            self.data += chunk
+            self.total_bytes += len(chunk)
+            self.condition.notify_all()
+
+    def finish(self):
+        with self.condition:
+            self.finished = True
+            self.condition.notify_all()
+
+    def cancel(self):
+        """Ends the stream early; the decoder sees end of data on its next read."""
+        with self.condition:
+            self.cancelled = True
+            self.finished = True
+            self.condition.notify_all()
+
+    def wait_for_prebuffer(self, num_bytes: int):
+        """Blocks until num_bytes are buffered or the stream has finished."""
+        with self.condition:
+            self.condition.wait_for(
+                lambda: self.finished or len(self.data) - self.position >= num_bytes)
+
+    def read(self, num_bytes: int) -> bytes:
+        with self.condition:
+            self.condition.wait_for(
+                lambda: self.finished or len(self.data) > self.position)
+            if self.cancelled:
+                return b""
+            chunk = bytes(self.data[self.position:self.position + num_bytes])
+            self.position += len(chunk)
+            if self.position > 65536:  # Drop consumed data now and then
+                del self.data[:self.position]
+                self.position = 0
+            return chunk
+
+
+def decode_mp3_stream(source: MP3ChunkSource, output: AudioOutputService, generation=None):
+    """Decodes a growing MP3 stream into the output as it arrives. Runs on a worker thread."""
+    source.wait_for_prebuffer(JITTER_BUFFER_BYTES)
+    if source.total_bytes == 0:
+        return
+    frames = miniaudio.stream_any(
+        source,
+        source_format=miniaudio.FileFormat.MP3,
+        output_format=miniaudio.SampleFormat.SIGNED16,
+        nchannels=1,
+        sample_rate=TTS_SAMPLE_RATE,
+        frames_to_read=BUFFER_SIZE)
+    for samples in frames:
+        output.write(samples.tobytes(), generation=generation)
+
+
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])\s+|\n+')
+CLAUSE_BOUNDARY = re.compile(r'(?<=[,;:])\s+')
+
+
+def split_clauses(sentence: str) -> list:
+    """Splits an overly long sentence at clause boundaries into pieces of at most MAX_SENTENCE_CHARS."""
+    if len(sentence) <= MAX_SENTENCE_CHARS:
+        return [sentence]
+    pieces = []
+    current = ""
+    for clause in CLAUSE_BOUNDARY.split(sentence):
+        if current and len(current) + len(clause) + 1 > MAX_SENTENCE_CHARS:
+            pieces.append(current)
+            current = clause
+        else:
+            current = f"{current} {clause}" if current else clause
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def split_sentences(text: str):
+    """Splits text into speakable sentences.
+
+    Returns (complete sentences, tail), where the tail is text after the last boundary that
+    may still grow while a response is streaming in.
+    """
+    parts = SENTENCE_BOUNDARY.split(text)
+    tail = parts.pop()
+    sentences = []
+    current = ""
+    for part in parts:
+        current = f"{current} {part}".strip()
+        if len(current) >= MIN_SENTENCE_CHARS:
+            sentences.extend(split_clauses(current))
+            current = ""
+    if current:
+        tail = f"{current} {tail}"
+    return sentences, tail
+
+
+def speakable_sentences(text: str) -> list:
+    """Splits a complete text into the sentences SpeechPipeline would synthesize."""
+    sentences, tail = split_sentences(text)
+    if tail.strip():
+        sentences.extend(split_clauses(tail.strip()))
+    return sentences
+
+
+class TTSCache:
+    """Content-addressed cache of synthesized speech.
+
+    Entries hold MP3 bytes keyed by a hash of (text, voice, rate) and are kept in memory,
+    evicting the least recently used first. Only the sentences of the fixed phrases are also
+    stored on disk, so replies, which can read out emails and messages, never leave the
+    process. Disk access runs on a worker thread. When the disk tier outgrows disk_bytes, the
+    least recently used files are removed down to low_water_bytes.
+    """
+
+    def __init__(self,
+                 directory: str = TTS_CACHE_DIR,
+                 memory_bytes: int = TTS_CACHE_MEMORY_BYTES,
+                 disk_bytes: int = TTS_CACHE_DISK_BYTES,
+                 low_water_bytes: int = TTS_CACHE_DISK_LOW_WATER,
+                 phrases=STATIC_PHRASES):
+        self.directory = directory
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self.low_water_bytes = low_water_bytes
+        self.memory = OrderedDict()
+        self.memory_size = 0
+        self.persistent = {self.key(sentence) for phrase in phrases for sentence in speakable_sentences(phrase)}
+        self.disk_lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self.disk_size = 0
+        for entry in os.scandir(directory):
+            if not entry.name.endswith(".mp3"):
+                continue
+            if entry.name[:-4] in self.persistent:
+                self.disk_size += entry.stat().st_size
+            else:
+                # Left by a version that stored every reply, or by a different voice or rate
+                try:
+                    os.remove(entry.path)
+                except OSError:
+                    pass
+
+    @staticmethod
+    def key(text: str, voice: str = VOICE, rate: str = TTS_RATE) -> str:
+        return hashlib.sha256(f"{voice}\n{rate}\n{text}".encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.mp3")
+
+    def _remember(self, key: str, data: bytes):
+        if key in self.memory:
+            self.memory_size -= len(self.memory[key])
+        self.memory[key] = data
+        self.memory.move_to_end(key)
+        self.memory_size += len(data)
+        while self.memory_size > self.memory_bytes and self.memory:
+            _, evicted = self.memory.popitem(last=False)
+            self.memory_size -= len(evicted)
+
+    async def get(self, text: str):
+        """Returns the cached MP3 bytes for text, or None."""
+        key = self.key(text)
+        data = self.memory.get(key)
+        if data is not None:
+            self.memory.move_to_end(key)
+            return data
+        if key not in self.persistent:
+            return None
+        data = await asyncio.to_thread(self._read_disk, key)
+        if data is not None:
+            self._remember(key, data)
+        return data
+
+    async def put(self, text: str, data: bytes):
+        """Stores MP3 bytes for text in memory, and on disk if it is part of a fixed phrase."""
+        if not data:
+            return
+        key = self.key(text)
+        self._remember(key, data)
+        if key in self.persistent:
+            await asyncio.to_thread(self._write_disk, key, data)
+
+    def _read_disk(self, key: str):
         try:
-            if os.path.exists(file_path):
-                os.remove(file_path)
-            break
-        except Exception as e:
-            print(f"Error removing file '{file_path}': {e}")
-            attempts += 1
-            time.sleep(0.1)
+            with open(self._path(key), "rb") as f:
+                data = f.read()
+            os.utime(self._path(key))  # Mark as recently used for disk eviction
+            return data
+        except OSError:
+            return None
+
+    def _write_disk(self, key: str, data: bytes):
+        path = self._path(key)
+        if os.path.exists(path):
+            return
+        try:
+            with open(path, "wb") as f:
+                f.write(data)
+        except OSError as e:
+            print(f"\033[91mError writing TTS cache entry: {e}\033[0m")
+            return
+        with self.disk_lock:
+            self.disk_size += len(data)
+            if self.disk_size > self.disk_bytes:
+                self._evict_disk()
+
+    def _evict_disk(self):
+        # Caller holds disk_lock. Freeing down to the low-water mark keeps this from running on every write.
+        entries = sorted((entry.stat().st_mtime, entry.stat().st_size, entry.path)
+                         for entry in os.scandir(self.directory) if entry.name.endswith(".mp3"))
+        self.disk_size = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if self.disk_size <= self.low_water_bytes:
+                break
+            try:
+                os.remove(path)
+                self.disk_size -= size
+            except OSError:
+                pass
+
+
+tts_cache = TTSCache()
+
 
+async def synthesize_speech(TEXT) -> bytes:
+    """Synthesizes TEXT with edge_tts and returns the complete MP3 bytes."""
+    chunks = []
+    async for chunk in edge_tts.Communicate(TEXT, VOICE, rate=TTS_RATE).stream():
+        if chunk["type"] == "audio":
+            chunks.append(chunk["data"])
+    return b"".join(chunks)
 
-async def generate_tts(TEXT, output_file):
+
+async def generate_tts(TEXT) -> bytes:
+    """Returns the MP3 bytes for TEXT from the cache, synthesizing them if needed."""
+    data = await tts_cache.get(TEXT)
+    if data is not None:
+        return data
     try:
         print("\033[92mGenerating TTS...\033[0m")
-        cm_txt = edge_tts.Communicate(TEXT, VOICE)
-        await cm_txt.save(output_file)
+        data = await synthesize_speech(TEXT)
+        await tts_cache.put(TEXT, data)
         print("\033[94mTTS Generation Complete.\033[0m")
+        return data
     except Exception as e:
         print(f"\033[91mError during TTS generation: {e}\033[0m")
+        return b""
 
 
-def play_audio(file_path):
-    print("\033[92mPlaying audio...\033[0m")
-    try:
-        pygame.mixer.init()
-        pygame.mixer.music.load(file_path)
-        pygame.mixer.music.play()
-        while pygame.mixer.music.get_busy():
-            pygame.time.Clock().tick(10)
-        pygame.mixer.quit()
-    except Exception as e:
-        print(f"\033[91mError playing audio with Pygame: {e}\033[0m")
-        pygame.mixer.quit()
+async def prewarm_tts_cache(phrases=STATIC_PHRASES):
+    """Synthesizes any fixed phrases that are not cached yet."""
+    for phrase in phrases:
+        for sentence in speakable_sentences(phrase):
+            if await tts_cache.get(sentence) is not None:
+                continue
+            try:
+                await tts_cache.put(sentence, await synthesize_speech(sentence))
+            except Exception as e:
+                print(f"\033[91mError pre-warming TTS cache: {e}\033[0m")
+                return
+
+
+class SpeechPipeline:
+    """Speaks text sentence by sentence, synthesizing ahead while earlier sentences play.
+
+    Text can be fed all at once or as it streams in. Sentences are synthesized in order by one
+    task and played in order by another, with at most prefetch_depth sentences synthesized ahead
+    of the one playing.
+    """
+
+    def __init__(self, prefetch_depth: int = TTS_PREFETCH_DEPTH):
+        self.prefetch_depth = prefetch_depth
+        self.pending_text = ""
+        self.played_bytes = 0
+        self.sources = []
+        self.generation = audio_output.generation
+        self.sentences = asyncio.Queue()
+        # The player holds one more decoded sentence on the output, so this bounds the total to prefetch_depth
+        self.audio = asyncio.Queue(maxsize=max(1, prefetch_depth - 1))
+        self.synthesizer = asyncio.ensure_future(self._synthesize())
+        self.player = asyncio.ensure_future(self._play())
+
+    def feed(self, text: str):
+        """Adds text and queues every sentence that is now complete."""
+        sentences, self.pending_text = split_sentences(self.pending_text + text)
+        for sentence in sentences:
+            self.sentences.put_nowait(sentence)
+
+    def close(self):
+        """Queues any remaining text and marks the end of the response."""
+        if self.pending_text.strip():
+            for sentence in split_clauses(self.pending_text.strip()):
+                self.sentences.put_nowait(sentence)
+        self.pending_text = ""
+        self.sentences.put_nowait(None)
+
+    async def wait(self):
+        """Waits until every queued sentence has been played."""
+        try:
+            await self.player
+        finally:
+            self.synthesizer.cancel()
+
+    def cancel(self):
+        """Stops synthesis and playback and drops any audio already queued on the output."""
+        self.synthesizer.cancel()
+        self.player.cancel()
+        for source in self.sources:
+            source.cancel()
+        audio_output.flush()
+
+    async def _synthesize(self):
+        while True:
+            sentence = await self.sentences.get()
+            if sentence is None:
+                break
+            source = MP3ChunkSource()
+            self.sources.append(source)
+            await self.audio.put(source)
+            cached = await tts_cache.get(sentence)
+            if cached is not None:
+                source.feed(cached)
+                source.finish()
+                continue
+            chunks = []
+            try:
+                async for chunk in edge_tts.Communicate(sentence, VOICE, rate=TTS_RATE).stream():
+                    if chunk["type"] == "audio":
+                        source.feed(chunk["data"])
+                        chunks.append(chunk["data"])
+                source.finish()
+                await tts_cache.put(sentence, b"".join(chunks))
+            except Exception as e:
+                print(f"\033[91mError during streaming TTS: {e}\033[0m")
+            finally:
+                source.finish()
+        await self.audio.put(None)
+
+    async def _play(self):
+        # Sentences are decoded back to back into the shared output, so there is no gap between them.
+        # Decoding is faster than real time, so the player waits for the sentence prefetch_depth
+        # back to finish playing before decoding another. That holds synthesis to the same pace.
+        sentences_played = deque()
+        while True:
+            while len(sentences_played) >= self.prefetch_depth:
+                await sentences_played.popleft()
+            source = await self.audio.get()
+            if source is None:
+                break
+            await asyncio.to_thread(decode_mp3_stream, source, audio_output, self.generation)
+            self.played_bytes += source.total_bytes
+            sentences_played.append(audio_output.drain(self.generation))
+        await audio_output.drain(self.generation)
 
 
-async def speak(TEXT):
-    output_file = "output.mp3"
+class BargeInMonitor:
+    """Watches the microphone with Silero VAD while the assistant is speaking.
 
-    remove_file(output_file)
+    wait_for_speech() returns once the user has been talking for min_speech_ms, so playback
+    can be cut off. Cancel the waiting task to stop listening. Speaker echo of the assistant's
+    own voice is also speech to the VAD, so this is meant for headphones. With echo_gate the
+    monitor measures how loud the echo of the playing output is at the mic, and a window only
+    counts when the mic is louder than that by echo_margin.
 
-    await generate_tts(TEXT, output_file)
+    After a barge-in the microphone keeps recording, from just before speech onset, until the
+    STT backend collects it with take_audio(), so the user's first words are not lost. If more
+    speech starts playing first, recording stops so the assistant's voice is not captured, and
+    what was recorded so far is kept for take_audio().
+    """
 
-    if os.path.exists(output_file):
-        play_audio(output_file)
+    def __init__(
+            self,
+            threshold: float = BARGE_IN_THRESHOLD,
+            min_speech_ms: int = BARGE_IN_MIN_SPEECH_MS,
+            echo_gate: bool = BARGE_IN_SPEAKERS,
+            echo_margin: float = BARGE_IN_ECHO_MARGIN,
+            pre_roll_ms: int = BARGE_IN_PRE_ROLL_MS,
+            sample_rate: int = STT_SAMPLE_RATE):
+        self.model = load_silero_vad(onnx=True)
+        self.threshold = threshold
+        self.echo_gate = echo_gate
+        self.echo_margin = echo_margin
+        self.echo_gain = None  # Measured mic RMS per unit of output level, learned while playing
+        self.sample_rate = sample_rate
+        self.min_speech_windows = max(1, int(min_speech_ms * sample_rate / 1000) // VAD_WINDOW_SIZE)
+        self.pre_roll_windows = int(pre_roll_ms * sample_rate / 1000) // VAD_WINDOW_SIZE
+        self.lock = threading.Lock()
+        self.recording = None  # Input stream kept open after a barge-in until take_audio()
+        self.captured = []  # int16 PCM blocks recorded for the STT backend
+
+    async def wait_for_speech(self, keep_audio: bool = True):
+        """Returns once the user talks over playback. With keep_audio, recording continues for take_audio()."""
+        loop = asyncio.get_running_loop()
+        detected = asyncio.Event()
+        vad = VADIterator(self.model, threshold=self.threshold, sampling_rate=self.sample_rate)
+        recent = deque(maxlen=self.pre_roll_windows + self.min_speech_windows)
+        self._stop_recording()
+        speech_windows = 0
+        handed_off = False
+
+        def audio_callback(indata, frames, time_info, status):
+            nonlocal speech_windows, handed_off
+            samples = indata[:, 0]
+            pcm = (np.clip(samples, -1.0, 1.0) * 32767).astype(np.int16).tobytes()
+            if handed_off:
+                with self.lock:
+                    self.captured.append(pcm)
+                return
+            recent.append(pcm)
+            speech_dict = vad(torch.from_numpy(samples.copy()))
+            if (speech_dict and 'end' in speech_dict) or not self._above_echo(samples, speech_windows):
+                speech_windows = 0
+            elif vad.triggered:
+                speech_windows += 1
+                if speech_windows == self.min_speech_windows:
+                    if keep_audio:
+                        with self.lock:
+                            self.captured.extend(recent)
+                        handed_off = True
+                    loop.call_soon_threadsafe(detected.set)
+
+        stream = sd.InputStream(channels=1,
+                                samplerate=self.sample_rate,
+                                blocksize=VAD_WINDOW_SIZE,
+                                dtype='float32',
+                                callback=audio_callback)
+        stream.start()
+        try:
+            await detected.wait()
+        finally:
+            if keep_audio and detected.is_set():
+                with self.lock:
+                    self.recording = stream
+            else:
+                stream.close()
+
+    def _above_echo(self, samples, speech_windows: int) -> bool:
+        """Returns True if a mic window is louder than the expected echo of the output playing now."""
+        output_level = audio_output.level
+        if not self.echo_gate or output_level <= OUTPUT_SILENCE_LEVEL:
+            return True
+        mic_level = float(np.sqrt(np.mean(samples ** 2)))
+        if speech_windows == 0:
+            # Most windows during playback are echo, so the odd barge-in barely moves the estimate
+            ratio = mic_level / output_level
+            if self.echo_gain is None:
+                self.echo_gain = ratio
+            else:
+                self.echo_gain += BARGE_IN_ECHO_ADAPT * (ratio - self.echo_gain)
+        return mic_level > self.echo_gain * output_level * self.echo_margin
+
+    def _stop_recording(self):
+        with self.lock:
+            stream, self.recording = self.recording, None
+        # Closed outside the lock, which the callback needs until it has stopped
+        if stream is not None:
+            stream.close()
+
+    def take_audio(self) -> bytes:
+        """Stops recording after a barge-in and returns 16-bit mono PCM from speech onset, or b''."""
+        self._stop_recording()
+        with self.lock:
+            captured, self.captured = self.captured, []
+        return b"".join(captured)
+
+
+# Global instance of the barge-in monitor; None disables barge-in
+barge_in_monitor = None
+
+
+async def wait_for_playback(pipeline: SpeechPipeline) -> bool:
+    """Waits for the pipeline to finish playing. Returns True if the user interrupted it."""
+    if barge_in_monitor is None:
+        await pipeline.wait()
+        return False
+
+    # A listen() already running holds back what its own stream heard during playback and
+    # transcribes it once playback is cut off, so the monitor keeps nothing for it
+    keep_audio = stt_listener is None or not stt_listener.listening
+    listener = asyncio.ensure_future(barge_in_monitor.wait_for_speech(keep_audio))
+    playback = asyncio.ensure_future(pipeline.wait())
+    try:
+        done, _ = await asyncio.wait({listener, playback}, return_when=asyncio.FIRST_COMPLETED)
+        if playback in done or listener.exception() is not None:
+            if listener in done and listener.exception() is not None:
+                print(f"\033[91mBarge-in monitor stopped: {listener.exception()}\033[0m")
+            await playback
+            return False
+    finally:
+        listener.cancel()
+
+    print("\n\033[93mUser started speaking. Stopping playback.\033[0m")
+    pipeline.cancel()
+    await asyncio.gather(playback, return_exceptions=True)
+    return True
+
+
+# Serializes utterances so queued speech plays one after another instead of interleaving
+speech_lock = asyncio.Lock()
+
+
+async def speak(TEXT) -> bool:
+    """Speaks TEXT. Returns True if the user interrupted it, or had interrupted playback while it waited."""
+    generation = audio_output.generation
+    async with speech_lock:
+        if audio_output.generation != generation:
+            # The user interrupted playback while this utterance was waiting, so drop it
+            return True
+        print("\033[92mStreaming TTS...\033[0m")
+        pipeline = SpeechPipeline()
+        pipeline.feed(TEXT)
+        pipeline.close()
+        try:
+            if await wait_for_playback(pipeline):
+                return True
+        except Exception as e:
+            print(f"\033[91mError playing streamed audio: {e}\033[0m")
+        if pipeline.played_bytes == 0:
+            await play_complete_audio(TEXT)
+    return False
+
+
+async def play_complete_audio(TEXT):
+    """Fallback for when streaming playback produced no audio. Caller holds speech_lock."""
+    print("\033[93mStreaming playback unavailable. Playing the complete audio instead.\033[0m")
+    data = await generate_tts(TEXT)
+    if data:
+        await play_audio(data)
     else:
-        print(
-            "\033[91mOutput MP3 file not found after TTS generation. Cannot play.\033[0m")
+        print("\033[91mNo audio was generated. Cannot play.\033[0m")
 
-    remove_file(output_file)
+
+async def speak_stream(deltas):
+    """Speaks text from an async iterator of deltas as it arrives.
+
+    Each sentence is synthesized as soon as it is complete, so speech starts with the first
+    sentence of a streamed reply instead of after the last one. Nothing is played if the
+    stream carries no text, such as a reply that only calls tools.
+
+    Returns (full text, interrupted), where interrupted is True if the user talked over the
+    reply, or had interrupted playback while it waited, so not all of the text was heard.
+    """
+    generation = audio_output.generation
+    text = ""
+    async with speech_lock:
+        if audio_output.generation != generation:
+            # The user interrupted playback while this waited, so drop it like a queued speak()
+            async for delta in deltas:
+                text += delta
+            return text, True
+        pipeline = None
+        try:
+            async for delta in deltas:
+                text += delta
+                if pipeline is None:
+                    pipeline = SpeechPipeline()
+                pipeline.feed(delta)
+            if pipeline is None:
+                return text, False
+            pipeline.close()
+            if await wait_for_playback(pipeline):
+                return text, True
+        except BaseException:
+            if pipeline is not None:
+                pipeline.cancel()
+            raise
+        if pipeline.played_bytes == 0 and text.strip():
+            await play_complete_audio(text)
+    return text, False
+
+
+def record_interrupted_reply(conversation_history: list, text: str):
+    """Logs a reply the user talked over, marked as cut off since only part of it was heard."""
+    print("\033[93mReply interrupted by the user.\033[0m")
+    if text.strip():
+        print(text)
+    note = f"{text.strip()} [cut off by the user]".strip()
+    log_message(note, "Dhrishti")
+    conversation_history.append({"role": "model", "parts": [{"text": note}]})
+
+
+async def response_text_deltas(response, on_function_call=None):
+    """Yields the text of a streaming Gemini response chunk by chunk.
+
+    Function call parts are passed to on_function_call as soon as the chunk carrying them
+    arrives, so tool requests are picked out of the same stream the text is spoken from.
+    """
+    async for chunk in response:
+        if not chunk.candidates:
+            continue
+        for part in chunk.candidates[0].content.parts:
+            if part.function_call:
+                if on_function_call is not None:
+                    on_function_call(part.function_call)
+                    print(f"\033[93mGemini requested tool '{part.function_call.name}'.\033[0m")
+            elif part.text:
+                yield part.text
 
 # --- Vision Capture Functions ---
 
 
+class CameraService:
+    """Keeps the webcam open in the background while it is in use.
+
+    A reader thread grabs frames continuously and keeps only the latest one, so callers get a
+    fresh, properly exposed frame without reopening the device. The webcam is released after
+    idle_timeout seconds without requests and reopened on the next one.
+    """
+
+    def __init__(
+            self,
+            index: int = CAMERA_INDEX,
+            idle_timeout: float = CAMERA_IDLE_TIMEOUT,
+            warmup_seconds: float = CAMERA_WARMUP_SECONDS):
+        self.index = index
+        self.idle_timeout = idle_timeout
+        self.warmup_seconds = warmup_seconds
+        self.lock = threading.Lock()
+        self.frame_ready = threading.Condition(self.lock)
+        self.latest_frame = None
+        self.last_request = 0.0
+        self.thread = None
+        self.failed = False
+
+    def _run(self):
+        cap = cv2.VideoCapture(self.index)
+        if not cap.isOpened():
+            print(
+                "\033[91mError: Could not open webcam. Make sure it's not in use by another application.\033[0m")
+            with self.lock:
+                self.failed = True
+                self.thread = None
+                self.frame_ready.notify_all()
+            return
+
+        opened_at = time.time()
+        failed_reads = 0
+        try:
+            while True:
+                ret, frame = cap.read()
+                now = time.time()
+                with self.lock:
+                    if now - self.last_request > self.idle_timeout:
+                        self.thread = None
+                        self.latest_frame = None
+                        break
+                    if not ret:
+                        failed_reads += 1
+                        if failed_reads >= 10:
+                            print("\033[91mError: Could not read frame from webcam.\033[0m")
+                            self.failed = True
+                            self.thread = None
+                            self.latest_frame = None
+                            self.frame_ready.notify_all()
+                            break
+                        continue
+                    failed_reads = 0
+                    if now - opened_at >= self.warmup_seconds:
+                        self.latest_frame = frame
+                        self.frame_ready.notify_all()
+        finally:
+            cap.release()
+            print("\033[94mWebcam released.\033[0m")
+
+    def get_frame(self, timeout: float = 5.0):
+        """Returns the latest BGR frame, opening the webcam if needed. Returns None on failure."""
+        with self.lock:
+            self.last_request = time.time()
+            if self.thread is None:
+                self.failed = False
+                self.thread = threading.Thread(target=self._run, daemon=True)
+                self.thread.start()
+            self.frame_ready.wait_for(
+                lambda: self.latest_frame is not None or self.failed, timeout)
+            return self.latest_frame
+
+    def close(self):
+        """Releases the webcam once the reader thread notices."""
+        with self.lock:
+            self.last_request = 0.0
+
+
+camera_service = CameraService()
+
+
 def capture_webcam_image():
-    """Captures an image from the webcam and returns it as a PIL Image object.
+    """Returns the latest webcam frame as a PIL Image object.
     Returns None if capture fails.
     """
-    cap = cv2.VideoCapture(0)  # 0 is typically the default webcam
-    if not cap.isOpened():
-        print(
-            "\033[91mError: Could not open webcam. Make sure it's not in use by another application.\033[0m")
-        return None
-
-    ret, frame = cap.read()
-    cap.release()  # Release the webcam immediately
+    frame = camera_service.get_frame()
 
-    if ret:
+    if frame is not None:
         img_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
         pil_image = Image.fromarray(img_rgb)
         print("\033[94mWebcam image captured as PIL Image object.\033[0m")
         return pil_image
     else:
-        print("\033[91mError: Could not read frame from webcam.\033[0m")
+        print("\033[91mError: Could not get a frame from the webcam.\033[0m")
         return None
 
 
-def capture_screen_image():
-    """Captures a screenshot of the primary monitor and returns it as a PIL Image object.
+def resolve_capture_region(sct, target=DEFAULT_SCREEN_TARGET) -> dict:
+    """Returns the mss region to grab for a capture target.
+
+    target is "monitor" (the monitor under the mouse cursor), "primary", "window" (the focused
+    window), "all" (every monitor combined) or an explicit (left, top, width, height) region.
+    """
+    if isinstance(target, (tuple, list)):
+        left, top, width, height = (int(v) for v in target)
+        return {"left": left, "top": top, "width": width, "height": height}
+    if target == "all":
+        return sct.monitors[0]
+    if target == "primary":
+        return sct.monitors[1]
+    if target == "window":
+        try:
+            window = pyautogui.getActiveWindow()  # Only available on Windows
+            desktop = sct.monitors[0]
+            # Clip to the desktop; maximized windows extend a few pixels past the screen edge
+            left = max(window.left, desktop["left"])
+            top = max(window.top, desktop["top"])
+            right = min(window.left + window.width, desktop["left"] + desktop["width"])
+            bottom = min(window.top + window.height, desktop["top"] + desktop["height"])
+            if right > left and bottom > top:
+                return {"left": left, "top": top, "width": right - left, "height": bottom - top}
+        except Exception as e:
+            print(f"\033[93mCould not find the focused window ({e}). Capturing the active monitor.\033[0m")
+    x, y = pyautogui.position()
+    for monitor in sct.monitors[1:]:
+        if (monitor["left"] <= x < monitor["left"] + monitor["width"]
+                and monitor["top"] <= y < monitor["top"] + monitor["height"]):
+            return monitor
+    return sct.monitors[1]
+
+
+def capture_screen_image(target=DEFAULT_SCREEN_TARGET):
+    """Captures a screenshot of the given target (see resolve_capture_region) and returns it as a PIL Image object.
     Returns None if capture fails.
     """
     try:
-        # print(f"Current working directory for screenshot debug: {os.getcwd()}") # Removed debug print
         with mss.mss() as sct:
-            monitor = sct.monitors[0]
-            sct_img = sct.grab(monitor)
-            pil_image = Image.frombytes(
-                "RGB", sct_img.size, sct_img.bgra, "raw", "BGRX")
+            region = resolve_capture_region(sct, target)
+            sct_img = sct.grab(region)
+            pil_image = screen_frame_to_image(sct_img.raw, sct_img.width, sct_img.height)
             print("\033[94mScreenshot captured as PIL Image object.\033[0m")
             return pil_image
     except Exception as e:
         print(f"\033[91mError capturing screenshot: {e}\033[0m")
         return None
 
+
+def prepare_image(pil_image, max_edge: int = IMAGE_MAX_EDGE):
+    """Downscales an image and encodes it compactly before it is sent to Gemini.
+
+    Screen-like content (few distinct colors) is encoded as WebP so text stays sharp, and
+    photographic content as JPEG. Returns an inline image part and its size in bytes.
+    """
+    image = pil_image if pil_image.mode == "RGB" else pil_image.convert("RGB")
+    if max(image.size) > max_edge:
+        scale = max_edge / max(image.size)
+        image = image.resize((max(1, round(image.width * scale)), max(1, round(image.height * scale))),
+                             Image.LANCZOS)
+
+    # Nearest-neighbour sampling keeps flat UI colors from blending into new ones
+    colors = image.resize((64, 64), Image.NEAREST).getcolors(4096)
+    screen_like = colors is not None and len(colors) <= SCREEN_LIKE_MAX_COLORS
+
+    buffer = io.BytesIO()
+    if screen_like:
+        image.save(buffer, "WEBP", quality=WEBP_QUALITY, method=4)
+        mime_type = "image/webp"
+    else:
+        image.save(buffer, "JPEG", quality=JPEG_QUALITY, optimize=True)
+        mime_type = "image/jpeg"
+    data = buffer.getvalue()
+    print(
+        f"\033[94mSending {image.width}x{image.height} {mime_type} to Gemini ({len(data) / 1024:.0f} KB).\033[0m")
+    return {"mime_type": mime_type, "data": data}, len(data)
+
+def perceptual_hash(pil_image, hash_size: int = SCREEN_HASH_SIZE):
+    """Returns a difference hash (dHash) of an image as a flat boolean NumPy array.
+
+    Each bit records whether a cell of a small grayscale thumbnail is brighter than its right
+    neighbour, so compression noise, cursor blinks and tiny repaints barely move the hash.
+    """
+    thumbnail = pil_image.convert("L").resize((hash_size + 1, hash_size), Image.BOX)
+    pixels = np.asarray(thumbnail, dtype=np.int16)
+    return (pixels[:, 1:] > pixels[:, :-1]).ravel()
+
+
+def capture_screen_for_description(target=DEFAULT_SCREEN_TARGET):
+    """Captures target and returns (image, RGB frame array, perceptual hash), or None if capture fails.
+
+    Everything that touches the full-size capture happens here, on the calling worker thread.
+    """
+    pil_image = capture_screen_image(target)
+    if pil_image is None:
+        return None
+    return pil_image, np.asarray(pil_image), perceptual_hash(pil_image)
+
+
+def normalize_query(user_query: str) -> str:
+    return " ".join(re.sub(r"[^\w\s]", " ", user_query.lower()).split())
+
+
+class ScreenDescriptionCache:
+    """Remembers recent screen descriptions so repeated questions about an unchanged screen are free.
+
+    Entries are keyed by capture target and normalized query and hold the perceptual hash of
+    the screenshot they describe. A lookup hits when the new screenshot's hash is within
+    max_distance bits of the stored one and the entry is younger than ttl seconds.
+    """
+
+    def __init__(self,
+                 max_distance: int = SCREEN_CACHE_MAX_DISTANCE,
+                 ttl: float = SCREEN_CACHE_TTL,
+                 max_entries: int = SCREEN_CACHE_MAX_ENTRIES):
+        self.max_distance = max_distance
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+
+    def get(self, image_hash, target, user_query: str):
+        """Returns the cached description for this screen and query, or None."""
+        key = (target, normalize_query(user_query))
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        stored_hash, created, description = entry
+        if time.monotonic() - created > self.ttl:
+            del self.entries[key]
+            return None
+        if np.count_nonzero(stored_hash != image_hash) > self.max_distance:
+            return None
+        self.entries.move_to_end(key)
+        return description
+
+    def put(self, image_hash, target, user_query: str, description: str):
+        key = (target, normalize_query(user_query))
+        self.entries[key] = (image_hash, time.monotonic(), description)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+
+screen_cache = ScreenDescriptionCache()
+
+
+def changed_tiles(previous, current, tile_size: int = SCREEN_TILE_SIZE):
+    """Returns a boolean grid marking which tile_size tiles differ between two RGB frames.
+
+    Frames of different shapes (a different monitor or window) count as entirely changed.
+    """
+    height, width = current.shape[:2]
+    rows, cols = -(-height // tile_size), -(-width // tile_size)
+    if previous is None or previous.shape != current.shape:
+        return np.ones((rows, cols), dtype=bool)
+    changed = cv2.absdiff(current, previous).max(axis=2) > SCREEN_PIXEL_THRESHOLD
+    changed = np.pad(changed, ((0, rows * tile_size - height), (0, cols * tile_size - width)))
+    counts = changed.reshape(rows, tile_size, cols, tile_size).sum(axis=(1, 3))
+    return counts >= SCREEN_TILE_MIN_PIXELS
+
+
+def change_regions(changed, frame_shape, tile_size: int = SCREEN_TILE_SIZE,
+                   max_regions: int = SCREEN_MAX_CHANGE_REGIONS):
+    """Groups changed tiles into pixel boxes (left, top, right, bottom), largest first."""
+    _, _, stats, _ = cv2.connectedComponentsWithStats(changed.astype(np.uint8), connectivity=8)
+    boxes = sorted(((x, y, x + w, y + h) for x, y, w, h, _ in stats[1:]),
+                   key=lambda box: (box[2] - box[0]) * (box[3] - box[1]), reverse=True)
+    if len(boxes) > max_regions:
+        boxes = [(min(box[0] for box in boxes), min(box[1] for box in boxes),
+                  max(box[2] for box in boxes), max(box[3] for box in boxes))]
+    height, width = frame_shape[:2]
+    return [(left * tile_size, top * tile_size, min(right * tile_size, width), min(bottom * tile_size, height))
+            for left, top, right, bottom in boxes]
+
+
+class ScreenWatcher:
+    """Remembers the screen the user was last told about so "what changed" questions only pay for the changes.
+
+    Nothing is captured between questions. changes() grabs a fresh frame of the same target
+    when asked and diffs it tile by tile against that reference frame.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.target = DEFAULT_SCREEN_TARGET
+        self.reference = None
+        self.reference_description = None
+
+    def set_reference(self, frame, target, description: str = None):
+        """Records frame as what the user was last told about for target."""
+        with self.lock:
+            self.target = target
+            self.reference = frame
+            self.reference_description = description
+
+    def changes(self, target):
+        """Captures target now and returns (frame, changed tile grid, last description).
+
+        Returns None if the user has not been told about this target yet or capture failed.
+        """
+        with self.lock:
+            if target != self.target or self.reference is None:
+                return None
+            reference, description = self.reference, self.reference_description
+        try:
+            with mss.mss() as sct:
+                sct_img = sct.grab(resolve_capture_region(sct, target))
+                frame = np.asarray(screen_frame_to_image(sct_img.raw, sct_img.width, sct_img.height))
+        except Exception as e:
+            print(f"\033[91mError capturing screenshot: {e}\033[0m")
+            return None
+        return frame, changed_tiles(reference, frame), description
+
+
+screen_watcher = ScreenWatcher()
+
+
+def scene_signature(frame):
+    """Returns a small blurred grayscale thumbnail of a BGR frame for scene change scoring."""
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(gray, GUIDE_SIGNATURE_SIZE, interpolation=cv2.INTER_AREA)
+    return cv2.GaussianBlur(small, (5, 5), 0)
+
+
+def scene_change_score(previous, current) -> float:
+    """Returns the fraction of two scene signatures that differs, from 0.0 to 1.0.
+
+    Each signature is centered on its own mean brightness first, so auto-exposure drift is not
+    mistaken for a new scene.
+    """
+    current = current.astype(np.int16) - int(current.mean())
+    previous = previous.astype(np.int16) - int(previous.mean())
+    return np.count_nonzero(np.abs(current - previous) > GUIDE_PIXEL_THRESHOLD) / current.size
+
+
+class GuideMode:
+    """Narrates the webcam view continuously for a user who is moving around.
+
+    Frames are sampled from camera_service every sample_interval seconds and scored locally
+    against the frame last described. Gemini is only asked again once the scene has changed by
+    change_threshold, at most every min_interval seconds and one request at a time, so changes
+    that happen while a description is being fetched or spoken are covered by the next one.
+    Descriptions are streamed into the speech pipeline as they arrive.
+    """
+
+    def __init__(self,
+                 sample_interval: float = GUIDE_SAMPLE_INTERVAL,
+                 change_threshold: float = GUIDE_CHANGE_THRESHOLD,
+                 min_interval: float = GUIDE_MIN_INTERVAL):
+        self.sample_interval = sample_interval
+        self.change_threshold = change_threshold
+        self.min_interval = min_interval
+        self.focus = ""
+        self.last_description = None
+        self.task = None
+
+    @property
+    def running(self) -> bool:
+        return self.task is not None and not self.task.done()
+
+    def start(self, focus: str = ""):
+        """Starts narrating, or only updates the focus if already running."""
+        self.focus = focus
+        if not self.running:
+            self.last_description = None
+            self.task = asyncio.ensure_future(self._run())
+
+    def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    async def _run(self):
+        reference = None
+        last_call = float("-inf")
+        try:
+            while True:
+                frame = await run_blocking(camera_service.get_frame, pool=capture_pool)
+                if frame is None:
+                    print("\033[91mGuide mode stopped: no webcam frames.\033[0m")
+                    await speak("Guide mode stopped because I can't see through the webcam.")
+                    return
+                signature = scene_signature(frame)
+                now = time.monotonic()
+                if now - last_call >= self.min_interval and (
+                        reference is None or scene_change_score(reference, signature) >= self.change_threshold):
+                    last_call = now
+                    reference = signature
+                    try:
+                        await self._narrate(frame)
+                    except Exception as e:
+                        # A failed request only delays this update until min_interval has passed
+                        print(f"\033[91mError describing the webcam view in guide mode: {e}\033[0m")
+                        reference = None
+                await asyncio.sleep(self.sample_interval)
+        except Exception as e:
+            print(f"\033[91mGuide mode stopped: {e}\033[0m")
+
+    async def _narrate(self, frame):
+        image_part, _ = await run_blocking(
+            prepare_image, Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)), pool=capture_pool)
+        prompt = ("You are guiding a blind user who is moving around. In one short sentence, describe what is "
+                  "in front of them now, mentioning obstacles, people and doors first")
+        if self.focus:
+            prompt += f" and focusing on {self.focus}"
+        prompt += "."
+        if self.last_description:
+            prompt += f" Only mention what is new since you last said: {self.last_description}"
+
+        # The request latency is paid here, before speech is blocked for anyone else
+        response = await model.generate_content_async(
+            contents=[prompt, image_part],
+            generation_config=genai.GenerationConfig(temperature=0.0),
+            stream=True,
+            request_options={"timeout": MODEL_REQUEST_TIMEOUT}
+        )
+        description, interrupted = await speak_stream(response_text_deltas(response))
+        if description.strip():
+            self.last_description = description.strip()
+            print(f"\033[94mGuide: {self.last_description}\033[0m")
+            log_message(self.last_description + (" [cut off by the user]" if interrupted else ""),
+                        "Dhrishti (guide)")
+
+
+guide_mode = GuideMode()
+
 # --- Gemini Tools ---
 
 
+@tool_registry.register(parallel_safe=True)
 async def describe_webcam_view(user_query: str) -> str:
     """Captures an image from the webcam, sends it to Gemini for description, and returns the raw analysis result.
     This tool is used when the user asks about their physical surroundings, what is in front of them, or what they see.
     """
     print("\033[93mAI is preparing to capture webcam view and describe it...\033[0m")
-    pil_image = capture_webcam_image()
+    pil_image = await run_blocking(capture_webcam_image, pool=capture_pool)
 
     if pil_image:
         try:
             # Rephrased prompt to avoid awkwardness with user_query
+            image_part, _ = await run_blocking(prepare_image, pil_image, pool=capture_pool)
             contents_with_image = [
                 f"Analyze this webcam image and provide a short and concise description focusing on {user_query}.",
-                pil_image
+                image_part
             ]
 
-            response = model.generate_content(
+            response = await model.generate_content_async(
                 contents=contents_with_image,
-                generation_config=genai.GenerationConfig(temperature=0.0)
+                generation_config=genai.GenerationConfig(temperature=0.0),
+                request_options={"timeout": MODEL_REQUEST_TIMEOUT}
             )
 
             if response.text:
@@ -527,30 +2120,60 @@ async def describe_webcam_view(user_query: str) -> str:
         return "I was unable to capture an image from the webcam."
 
 
-async def describe_screen_content(user_query: str) -> str:
+@tool_registry.register(parallel_safe=True)
+async def describe_screen_content(
+        user_query: str,
+        target: str = DEFAULT_SCREEN_TARGET,
+        left: int = None,
+        top: int = None,
+        width: int = None,
+        height: int = None) -> str:
     """Captures a screenshot of the current screen, sends it to Gemini for description, and returns the raw analysis result.
     This tool is used when the user asks about what's on their screen, what is displayed, or what their device shows.
+    Args:
+        target: What to capture. "monitor" for the screen the user is working on (default), "window" for only
+            the focused application window, "primary" for the main monitor, or "all" for every monitor combined.
+        left: Left edge in desktop pixels of a specific region to capture instead of target. Use together with top, width and height.
+        top: Top edge in desktop pixels of the region to capture.
+        width: Width in pixels of the region to capture.
+        height: Height in pixels of the region to capture.
     """
+    region = (left, top, width, height)
+    if None not in region and width > 0 and height > 0:
+        target = region
+    elif target not in SCREEN_CAPTURE_TARGETS:
+        target = DEFAULT_SCREEN_TARGET
     print(
-        "\033[93mAI is preparing to capture screen content and describe it...\033[0m")
-    pil_image = capture_screen_image()
-
-    if pil_image:
+        f"\033[93mAI is preparing to capture screen content ({target}) and describe it...\033[0m")
+    capture = await run_blocking(capture_screen_for_description, target, pool=capture_pool)
+
+    if capture:
+        pil_image, frame, image_hash = capture
+        cached = screen_cache.get(image_hash, target, user_query)
+        if cached is not None:
+            print("\033[94mScreen unchanged, reusing the previous description.\033[0m")
+            screen_watcher.set_reference(frame, target, cached)
+            return cached
         try:
             # Rephrased prompt to avoid awkwardness with user_query
+            image_part, _ = await run_blocking(prepare_image, pil_image, pool=capture_pool)
             contents_with_image = [
                 f"Analyze this screen image and provide a short and concise description focusing on {user_query}.",
-                pil_image
+                image_part
             ]
 
-            response = model.generate_content(
+            response = await model.generate_content_async(
                 contents=contents_with_image,
-                generation_config=genai.GenerationConfig(temperature=0.0)
+                generation_config=genai.GenerationConfig(temperature=0.0),
+                request_options={"timeout": MODEL_REQUEST_TIMEOUT}
             )
 
             if response.text:
                 print("\033[94mScreen analysis completed.\033[0m")
-                return response.text.strip()
+                description = response.text.strip()
+                screen_cache.put(image_hash, target, user_query, description)
+                screen_watcher.set_reference(frame, target, description)
+                return description
             else:
                 print(
                     "\033[91mGemini did not return a text description for the screen image.\033[0m")
@@ -562,6 +2185,84 @@ async def describe_screen_content(user_query: str) -> str:
         return "I was unable to capture your screen."
 
 
+@tool_registry.register(parallel_safe=True)
+async def describe_screen_changes(user_query: str, target: str = DEFAULT_SCREEN_TARGET) -> str:
+    """Describes only what has changed on the screen since the user was last told about it.
+    This tool is used when the user asks what changed, what is new, or whether something appeared, finished or updated on their screen.
+    Args:
+        target: What to watch, with the same choices as describe_screen_content.
+    """
+    if target not in SCREEN_CAPTURE_TARGETS:
+        target = DEFAULT_SCREEN_TARGET
+    print(f"\033[93mAI is checking what changed on the screen ({target})...\033[0m")
+    snapshot = await run_blocking(screen_watcher.changes, target, pool=capture_pool)
+    if snapshot is None:
+        # Nothing to compare against yet, so describe the whole screen and start watching
+        return await describe_screen_content(user_query, target)
+
+    frame, changed, last_description = snapshot
+    if not changed.any():
+        return "Nothing has changed on your screen since you last asked."
+
+    try:
+        height, width = frame.shape[:2]
+        if changed.mean() > SCREEN_FULL_CHANGE_FRACTION:
+            image_part, _ = await run_blocking(prepare_image, Image.fromarray(frame), pool=capture_pool)
+            image_parts = ["Most of the screen changed. This is the whole new screen.", image_part]
+        else:
+            overview, _ = await run_blocking(
+                prepare_image, Image.fromarray(frame), SCREEN_OVERVIEW_EDGE, pool=capture_pool)
+            image_parts = [f"Small overview of the whole {width}x{height} screen.", overview]
+            for left, top, right, bottom in change_regions(changed, frame.shape):
+                crop, _ = await run_blocking(
+                    prepare_image, Image.fromarray(frame[top:bottom, left:right]), pool=capture_pool)
+                image_parts += [f"Changed region from ({left}, {top}) to ({right}, {bottom}).", crop]
+
+        prompt = f"Describe briefly and concisely what changed on this screen, focusing on {user_query}."
+        if last_description:
+            prompt += f" Before the change the user was told: {last_description}"
+        response = await model.generate_content_async(
+            contents=[prompt, *image_parts],
+            generation_config=genai.GenerationConfig(temperature=0.0),
+            request_options={"timeout": MODEL_REQUEST_TIMEOUT}
+        )
+
+        if response.text:
+            print("\033[94mScreen change analysis completed.\033[0m")
+            description = response.text.strip()
+            screen_watcher.set_reference(frame, target, description)
+            return description
+        else:
+            print("\033[91mGemini did not return a description of the screen changes.\033[0m")
+            return "Your screen changed, but I couldn't get a description from Gemini."
+    except Exception as e:
+        print(f"\033[91mError sending screen changes to Gemini: {e}\033[0m")
+        return "Your screen changed, but I encountered an error while analyzing it."
+
+
+@tool_registry.register()
+async def start_guide_mode(user_query: str) -> str:
+    """Starts continuously describing the user's surroundings through the webcam as they change.
+    This tool is used when the user asks to be guided, to keep describing what is around them, or for help while walking or moving around.
+    """
+    guide_mode.start(user_query)
+    print("\033[93mGuide mode started.\033[0m")
+    return "Guide mode is on. I will describe your surroundings whenever they change."
+
+
+@tool_registry.register()
+async def stop_guide_mode() -> str:
+    """Stops the continuous webcam descriptions started by start_guide_mode.
+    This tool is used when the user asks to stop guiding, stop describing their surroundings, or to be quiet.
+    """
+    if not guide_mode.running:
+        return "Guide mode is not on."
+    guide_mode.stop()
+    print("\033[93mGuide mode stopped.\033[0m")
+    return "Guide mode is off."
+
+
+@tool_registry.register(timeout=60)  # pywhatkit opens WhatsApp Web and waits for it to load
 async def send_whatsapp_message(recipient_name: str, message_content: str) -> str:
     """Sends a WhatsApp message to a specified recipient.
     Args:
@@ -584,18 +2285,21 @@ async def send_whatsapp_message(recipient_name: str, message_content: str) -> st
     try:
         print(
             f"\033[93mAttempting to send WhatsApp message to {recipient_name} ({phone_no}): '{message_content}'\033[0m")
-        pywhatkit.sendwhatmsg_instantly(
+        await run_blocking(
+            pywhatkit.sendwhatmsg_instantly,
             phone_no=phone_no, message=message_content, wait_time=9, tab_close=True, close_time=2)
         return f"WhatsApp message sent to {recipient_name}."
     except Exception as e:
         return f"Failed to send WhatsApp message to {recipient_name}. Error: {e}"
 
 
+@tool_registry.register(timeout=15, parallel_safe=True)
 async def search_web(query: str) -> str:
     """Performs a Google search and returns the search results."""
     try:
         print(f"\033[93mSearching for: {query}\033[0m")
-        search_results = search(query, advanced=True)
+        # search() is a lazy generator that fetches pages while iterated, so collect it on the pool
+        search_results = await run_blocking(lambda: list(search(query, num_results=5, advanced=True)))
         final_result = ""
         result_count = 0
         for result in search_results:
@@ -608,6 +2312,7 @@ async def search_web(query: str) -> str:
         return f"Error performing web search: {e}"
 
 
+@tool_registry.register()
 async def call_whatsapp_contact(person_name: str, call_type: str = 'voice'):
     """
     Initiates a WhatsApp voice or video call to the specified contact using UI automation.
@@ -644,7 +2349,7 @@ async def call_whatsapp_contact(person_name: str, call_type: str = 'voice'):
         await asyncio.sleep(0.2)
 
         # Type the person's name
-        pyautogui.write(person_name, interval=0.1)
+        await run_blocking(pyautogui.write, person_name, interval=0.1)
         await asyncio.sleep(1.5)  # Wait for search results to appear
 
         # Click on the first search result (assuming it's the correct contact)
@@ -669,21 +2374,56 @@ async def call_whatsapp_contact(person_name: str, call_type: str = 'voice'):
         return f"Failed to initiate WhatsApp call to {person_name}. Error: {e}"
 
 
-AVAILABLE_TOOLS = [
-    describe_webcam_view,
-    describe_screen_content,
-    send_whatsapp_message,
-    search_web,
-    send_gmail_message,
-    read_gmail_messages,
-    call_whatsapp_contact,
-]
+async def execute_tool(spec: ToolSpec, args: dict) -> str:
+    """Runs a tool within its timeout. Synchronous tools run on tool_pool."""
+    try:
+        if spec.is_async:
+            return await asyncio.wait_for(spec.function(**args), spec.timeout)
+        return await run_blocking(spec.function, timeout=spec.timeout, **args)
+    except asyncio.TimeoutError:
+        print(f"\033[91mTool '{spec.name}' timed out after {spec.timeout}s and was cancelled.\033[0m")
+        return f"The action '{spec.name}' took too long and was cancelled."
+    except Exception as e:
+        # Reported to the model like any other result, so one failing call does not sink the rest of the turn
+        print(f"\033[91mTool '{spec.name}' failed: {e}\033[0m")
+        return f"The action '{spec.name}' failed. Error: {e}"
+
+
+async def run_tool_calls(calls) -> list:
+    """Runs one turn's (spec, args) tool calls and returns their results in call order.
+
+    calls is an async iterator, so each call can start as soon as it arrives in a streamed
+    response. Consecutive parallel-safe tools run together. The rest have side effects, such as
+    driving the UI or sending messages, so each runs alone in its place in the call order, after
+    the group before it has finished and before the next call starts.
+    """
+    tasks = []
+    group = []
+    try:
+        async for spec, args in calls:
+            if not spec.parallel_safe:
+                await asyncio.gather(*group)
+                group = []
+            task = asyncio.ensure_future(execute_tool(spec, args))
+            tasks.append(task)
+            if spec.parallel_safe:
+                group.append(task)
+            else:
+                await task
+        await asyncio.gather(*group)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+    return [task.result() for task in tasks]
+
 # --- Main Conversation Loop ---
 
 
 async def main_conversation_loop():
     print("Dhrishti: Hello! How can I assist you today? (Say 'exit' to quit)")
     await speak("Hello! How can I assist you today!")
+    prewarm_task = asyncio.ensure_future(prewarm_tts_cache())
 
     # Ensure log file exists
     if not os.path.exists(LOG_FILE):
@@ -709,8 +2449,7 @@ async def main_conversation_loop():
                                         {"text": f"Previous conversation log: {initial_log_content}"}]})
 
     while True:
-        # user_input = stt_listener.listen(prints=True)
-        user_input = input(">>> ")  # For testing without STT
+        user_input = await stt_listener.listen(prints=True)
 
         if user_input is None or user_input.lower() == "exit":
             log_message("system", "User exited conversation.")
@@ -733,146 +2472,159 @@ async def main_conversation_loop():
             conversation_history = conversation_history[-(MAX_HISTORY_LENGTH):]
 
         try:
-            response = model.generate_content(
+            response = await model.generate_content_async(
                 contents=conversation_history,
-                tools=AVAILABLE_TOOLS,
-                generation_config=genai.GenerationConfig(temperature=0.6)
+                tools=tool_registry.declarations,
+                generation_config=genai.GenerationConfig(temperature=0.6),
+                stream=True
             )
 
-            if response.candidates and response.candidates[0].content.parts:
-                tool_calls_to_execute = []
-                for part in response.candidates[0].content.parts:
-                    if part.function_call:
-                        tool_calls_to_execute.append(part.function_call)
-                        log_message(
-                            "model_tool_call", f"Requested tool: {part.function_call.name} with args: {part.function_call.args}")
+            # Text is spoken while it streams in. Function calls from the same stream start
+            # as soon as they arrive, while the text before them is still being spoken.
+            tool_calls_to_execute = []
+            arrived_calls = asyncio.Queue()
+
+            def on_function_call(tool_call):
+                tool_calls_to_execute.append(tool_call)
+                arrived_calls.put_nowait(tool_call)
+
+            async def reply_deltas():
+                try:
+                    async for delta in response_text_deltas(response, on_function_call):
+                        yield delta
+                finally:
+                    arrived_calls.put_nowait(None)  # No more calls can arrive
+
+            async def bound_calls():
+                while True:
+                    tool_call = await arrived_calls.get()
+                    if tool_call is None:
+                        return
+                    spec = tool_registry.get(tool_call.name)
+                    if spec:
+                        # user_input is passed to tools that take it for context (e.g., vision tools)
+                        yield spec, spec.bind(dict(tool_call.args or {}), user_query=user_input)
+
+            tools_task = asyncio.ensure_future(run_tool_calls(bound_calls()))
+            try:
+                gemini_text_response, interrupted = await speak_stream(reply_deltas())
+            except BaseException:
+                tools_task.cancel()
+                raise
+            if interrupted:
+                # The user is already talking again, so drop the rest of the turn and listen
+                if tools_task.cancel():
+                    print("\033[93mRequested tool calls cancelled.\033[0m")
+                record_interrupted_reply(conversation_history, gemini_text_response)
+                continue
+            if gemini_text_response.strip():
+                print(gemini_text_response)
+
+            if tool_calls_to_execute:
+                for tool_call in tool_calls_to_execute:
+                    log_message(
+                        "model_tool_call", f"Requested tool: {tool_call.name} with args: {tool_call.args}")
+                if gemini_text_response.strip():
+                    log_message(gemini_text_response, "Dhrishti")
+                print(
+                    "\033[93mWaiting for the requested tool calls to finish...\033[0m")
+
+                tool_results_list = []  # Store results to send back to model
+
+                resolved_calls = []
+                for tool_call in tool_calls_to_execute:
+                    tool_name = tool_call.name
+                    current_tool_args = {}
+                    if tool_call.args:
+                        for key, value in tool_call.args.items():
+                            current_tool_args[key] = value
+
+                    resolved_calls.append((tool_name, tool_registry.get(tool_name), current_tool_args))
+
+                tool_results = iter(await tools_task)
+
+                # History is recorded in the order Gemini made the calls, whatever order they finished in
+                for tool_name, spec, current_tool_args in resolved_calls:
+                    if spec:
+                        tool_result_text = next(tool_results)
 
-                if tool_calls_to_execute:
-                    print(
-                        "\033[93mGemini requested tool calls. Executing...\033[0m")
-
-                    tool_results_list = []  # Store results to send back to model
-
-                    for tool_call in tool_calls_to_execute:
-                        tool_name = tool_call.name
-                        current_tool_args = {}
-                        if tool_call.args:
-                            for key, value in tool_call.args.items():
-                                current_tool_args[key] = value
-
-                        called_function = next(
-                            (f for f in AVAILABLE_TOOLS if f.__name__ == tool_name), None)
-
-                        if called_function:
-                            # Pass user_input if the tool expects it for context (e.g., vision tools)
-                            if 'user_query' in called_function.__code__.co_varnames:
-                                current_tool_args['user_query'] = user_input
-
-                            if asyncio.iscoroutinefunction(called_function):
-                                tool_result_text = await called_function(**current_tool_args)
-                            else:
-                                tool_result_text = called_function(
-                                    **current_tool_args)
-
-                            print(
-                                f"\033[93mTool '{tool_name}' executed. Result: {tool_result_text}\033[0m")
-                            log_message(tool_result_text, tool_name)
-                            tool_results_list.append(tool_result_text)
-
-                            # Add tool call and response to conversation history
-                            conversation_history.append({
-                                "role": "model",
-                                "parts": [{
-                                    "function_call": {
-                                        "name": tool_name,
-                                        "args": current_tool_args
-                                    }
-                                }]
-                            })
-                            conversation_history.append({
-                                "role": "function",
-                                "parts": [{
-                                    "function_response": {
-                                        "name": tool_name,
-                                        "response": {"type": "text", "text": tool_result_text}
-                                    }
-                                }]
-                            })
-                        else:
-                            error_message = f"I'm sorry, I don't know how to perform the action '{tool_name}'."
-                            print(
-                                f"\033[91mError: Unknown tool '{tool_name}' requested by Gemini.\033[0m")
-                            log_message(
-                                "error", f"Unknown tool requested: {tool_name}")
-                            tool_results_list.append(error_message)
-                            conversation_history.append(
-                                {"role": "model", "parts": [{"text": error_message}]})
-
-                    # If tool results were generated, send them back to model for final response
-                    if tool_results_list:
                         print(
-                            "\033[93mSending tool results back to model for processing...\033[0m")
-
-                        final_response_from_model = model.generate_content(
-                            contents=conversation_history,  # Send entire updated history
-                            generation_config=genai.GenerationConfig(
-                                temperature=0.0)  # Low temperature for factual summarization of tool results
-                        )
-
-                        final_text_response = ""
-                        if final_response_from_model.candidates and final_response_from_model.candidates[0].content.parts:
-                            for part in final_response_from_model.candidates[0].content.parts:
-                                if part.text:
-                                    final_text_response += part.text
-
-                        if final_text_response.strip():
-                            print(final_text_response)
-                            await speak(final_text_response)
-                            log_message(final_text_response, "Dhrishti")
-                            conversation_history.append(
-                                {"role": "model", "parts": [{"text": final_text_response}]})
-                        else:
-                            await speak("I performed the requested action successfully, but I have no further details to add.")
-                            log_message(
-                                "Action performed, no further details.", "Dhrishti")
-                            conversation_history.append(
-                                {"role": "model", "parts": [{"text": "Action performed, no further details."}]})
-                    else:  # This path should ideally not be hit if tool_calls_to_execute was not empty
-                        await speak("I performed an action, but there was no direct response.")
+                            f"\033[93mTool '{tool_name}' executed. Result: {tool_result_text}\033[0m")
+                        log_message(tool_result_text, tool_name)
+                        tool_results_list.append(tool_result_text)
+
+                        # Add tool call and response to conversation history
+                        conversation_history.append({
+                            "role": "model",
+                            "parts": [{
+                                "function_call": {
+                                    "name": tool_name,
+                                    "args": current_tool_args
+                                }
+                            }]
+                        })
+                        conversation_history.append({
+                            "role": "function",
+                            "parts": [{
+                                "function_response": {
+                                    "name": tool_name,
+                                    "response": {"type": "text", "text": tool_result_text}
+                                }
+                            }]
+                        })
+                    else:
+                        error_message = f"I'm sorry, I don't know how to perform the action '{tool_name}'."
+                        print(
+                            f"\033[91mError: Unknown tool '{tool_name}' requested by Gemini.\033[0m")
                         log_message(
-                            "Action performed, no direct response.", "Dhrishti")
+                            "error", f"Unknown tool requested: {tool_name}")
+                        tool_results_list.append(error_message)
                         conversation_history.append(
-                            {"role": "model", "parts": [{"text": "Action performed, no direct response."}]})
-
-                else:  # Gemini provided a direct text response (no tool calls)
-                    gemini_text_response = ""
-                    for part in response.candidates[0].content.parts:
-                        if part.text:
-                            gemini_text_response += part.text
-                        else:
-                            print(
-                                "\033[91mGemini returned an unexpected part type (not text or function call).\033[0m")
-                            gemini_text_response += " I received an unusual response."
-
-                    if gemini_text_response.strip():
-                        print(gemini_text_response)
-                        await speak(gemini_text_response)
-                        log_message(gemini_text_response, "Dhrishti")
+                            {"role": "model", "parts": [{"text": error_message}]})
+
+                # If tool results were generated, send them back to model for final response
+                if tool_results_list:
+                    print(
+                        "\033[93mSending tool results back to model for processing...\033[0m")
+
+                    final_response_from_model = await model.generate_content_async(
+                        contents=conversation_history,  # Send entire updated history
+                        generation_config=genai.GenerationConfig(
+                            temperature=0.0),  # Low temperature for factual summarization of tool results
+                        stream=True
+                    )
+                    final_text_response, interrupted = await speak_stream(
+                        response_text_deltas(final_response_from_model))
+
+                    if interrupted:
+                        record_interrupted_reply(conversation_history, final_text_response)
+                    elif final_text_response.strip():
+                        print(final_text_response)
+                        log_message(final_text_response, "Dhrishti")
                         conversation_history.append(
-                            {"role": "model", "parts": [{"text": gemini_text_response}]})
+                            {"role": "model", "parts": [{"text": final_text_response}]})
                     else:
-                        print(
-                            "\033[91mGemini returned an empty text response.\033[0m")
-                        await speak("I'm sorry, I couldn't generate a response.")
-                        log_message("Empty response from Gemini.", "Dhrishti")
-                        conversation_history.append({"role": "model", "parts": [
-                                                    {"text": "I'm sorry, I couldn't generate a response."}]})
+                        await speak("I performed the requested action successfully, but I have no further details to add.")
+                        log_message(
+                            "Action performed, no further details.", "Dhrishti")
+                        conversation_history.append(
+                            {"role": "model", "parts": [{"text": "Action performed, no further details."}]})
+                else:  # This path should ideally not be hit if tool_calls_to_execute was not empty
+                    await speak("I performed an action, but there was no direct response.")
+                    log_message(
+                        "Action performed, no direct response.", "Dhrishti")
+                    conversation_history.append(
+                        {"role": "model", "parts": [{"text": "Action performed, no direct response."}]})
+
+            elif gemini_text_response.strip():  # Gemini provided a direct text response, already spoken
+                log_message(gemini_text_response, "Dhrishti")
+                conversation_history.append(
+                    {"role": "model", "parts": [{"text": gemini_text_response}]})
             else:
                 print(
-                    "\033[91mGemini did not return a response or candidate.\033[0m")
+                    "\033[91mGemini returned an empty response.\033[0m")
                 await speak("I'm sorry, I couldn't generate a response.")
-                log_message(
-                    "No candidate or response from Gemini.", "Dhrishti")
+                log_message("Empty response from Gemini.", "Dhrishti")
                 conversation_history.append({"role": "model", "parts": [
                                             {"text": "I'm sorry, I couldn't generate a response."}]})
 
@@ -885,13 +2637,21 @@ async def main_conversation_loop():
             conversation_history.append({"role": "model", "parts": [
                                         {"text": "I'm sorry, I encountered an error. Please try again."}]})
 
+    prewarm_task.cancel()
+    guide_mode.stop()
+    camera_service.close()
+    capture_pool.shutdown(wait=False, cancel_futures=True)
+    tool_pool.shutdown(wait=False, cancel_futures=True)
     if stt_listener:
         stt_listener.close()
+    audio_output.close()
 
 
 if __name__ == "__main__":
     try:
-        stt_listener = SpeechToTextListener()
+        stt_listener = create_stt_backend()
+        if BARGE_IN_ENABLED:
+            barge_in_monitor = BargeInMonitor()
         asyncio.run(main_conversation_loop())
     except KeyboardInterrupt:
         print("\nDhrishti: Conversation interrupted. Exiting.")
@@ -0,0 +1,29 @@
+import numpy as np
+from PIL import Image
+
+# Kept free of import-time side effects so tools such as bench_screen_capture.py can use it
+# without main.py's API key check, models and audio devices.
+IMAGE_MAX_EDGE = 1568  # Longest image edge sent to Gemini, in pixels
+
+
+def screen_frame_to_image(bgra, width: int, height: int, max_edge: int = IMAGE_MAX_EDGE):
+    """Converts a raw BGRA screenshot buffer into an RGB PIL image no larger than needed.
+
+    The buffer is read in place rather than through mss's bytes copy. Box-filter downscaling by
+    the largest whole factor that keeps the long edge at least max_edge and BGRA to RGB reordering
+    happen together on strided NumPy views, so no full-resolution copy is ever made.
+    """
+    factor = max(1, max(width, height) // max_edge)
+    if factor == 1:
+        # Nothing to drop; PIL's unpacker reorders straight out of the buffer
+        return Image.frombuffer("RGB", (width, height), bgra, "raw", "BGRX", 0, 1)
+    frame = np.frombuffer(bgra, dtype=np.uint8).reshape(height, width, 4)
+    out_h, out_w = height // factor, width // factor
+    # Each strided slice is a view; only the output-sized accumulator is allocated
+    acc = np.zeros((out_h, out_w, 3), dtype=np.uint16)
+    for dy in range(factor):
+        for dx in range(factor):
+            acc += frame[dy:out_h * factor:factor, dx:out_w * factor:factor, 2::-1]
+    acc //= factor * factor
+    rgb = acc.astype(np.uint8)
+    return Image.fromarray(rgb)
@@ -1,3 +1,7 @@
+import argparse
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import torch
 import torchaudio
 import sounddevice as sd
@@ -5,7 +9,7 @@ from silero_vad import load_silero_vad, collect_chunks, VADIterator
 import numpy as np
 from collections import deque
 import time
-from scipy.io.wavfile import write
+from scipy.io.wavfile import read
 import speech_recognition as sr
 
 # Configuration
@@ -13,11 +17,11 @@ SAMPLING_RATE = 16000  # Hertz
 WINDOW_SIZE = 512      # Number of samples per window (32ms for 16kHz)
 OVERLAP = 256          # Overlap between windows
 DEVICE = 'cuda' if torch.cuda.is_available() else 'cpu'
-
-start_time = 0
-collected_chunks = None
-is_recording = False
-is_speaking = False
+PRE_ROLL_SECONDS = 0.5         # Audio kept from before the VAD start event
+MAX_UTTERANCE_SECONDS = 30     # Utterances longer than this are split
+MAX_QUEUED_BLOCKS = 250        # About 8s of audio before the oldest blocks are dropped
+MAX_VAD_LAG_MS = 500           # More queued audio than this turns on VAD catch-up
+RECOGNITION_WORKERS = 2        # Utterances transcribed at the same time
 
 # Initialize Speech Recognition
 r = sr.Recognizer()
@@ -28,108 +32,362 @@ model = load_silero_vad(onnx=True)
 
 vad_iterator = VADIterator(model, sampling_rate=SAMPLING_RATE)
 
+
+class AudioBlockQueue:
+    """Bounded, thread-safe hand-off between the audio callback and the consumer.
+
+    The consumer blocks until audio arrives instead of polling. When it falls behind, the
+    oldest block is dropped so memory stays bounded and processing resumes near real time.
+    """
+
+    def __init__(self, max_blocks: int = MAX_QUEUED_BLOCKS):
+        self.blocks = deque(maxlen=max_blocks)
+        self.not_empty = threading.Condition()
+        self.overruns = 0   # Input overflows reported by the audio stream
+        self.dropped = 0    # Blocks discarded because the queue was full
+        self.max_depth = 0  # Deepest the queue has been
+
+    def __len__(self):
+        return len(self.blocks)
+
+    def lag_ms(self) -> float:
+        """Returns how much audio is waiting for the consumer, in milliseconds."""
+        return len(self.blocks) * WINDOW_SIZE / SAMPLING_RATE * 1000
+
+    def put(self, block):
+        with self.not_empty:
+            if len(self.blocks) == self.blocks.maxlen:
+                self.dropped += 1
+            self.blocks.append(block)
+            self.max_depth = max(self.max_depth, len(self.blocks))
+            self.not_empty.notify()
+
+    def get(self, timeout=None):
+        """Returns the oldest block, or None if nothing arrived within timeout seconds."""
+        with self.not_empty:
+            if not self.not_empty.wait_for(lambda: len(self.blocks) > 0, timeout):
+                return None
+            return self.blocks.popleft()
+
+    def stats(self) -> str:
+        return (f"queue depth {len(self.blocks)}/{self.blocks.maxlen}, max depth {self.max_depth}, "
+                f"dropped {self.dropped}, overruns {self.overruns}")
+
+
 # Queue to hold audio chunks
-audio_buffer = deque()
+audio_buffer = AudioBlockQueue()
+
+
+class UtteranceCapture:
+    """Collects VAD-gated speech into preallocated buffers.
+
+    Every block is written into a fixed-size pre-roll ring. When speech starts the ring is
+    copied once to the front of an utterance buffer, and following blocks are written after
+    it until speech ends. Two utterance buffers are used in turn, and finished utterances are
+    returned as NumPy views into them. A view stays valid until the utterance after the next
+    one starts, so copy it if you need to keep it longer.
+
+    Silero's state is recurrent, so windows cannot be scored as a batch. To catch up after a
+    stall, score() can instead skip the model for quiet blocks outside speech.
+    """
+
+    def __init__(self,
+                 sampling_rate: int = SAMPLING_RATE,
+                 pre_roll_seconds: float = PRE_ROLL_SECONDS,
+                 max_utterance_seconds: float = MAX_UTTERANCE_SECONDS):
+        self.pre_roll = np.zeros(int(pre_roll_seconds * sampling_rate), dtype=np.float32)
+        self.pre_roll_written = 0  # Total samples ever written to the ring
+        max_samples = int(max_utterance_seconds * sampling_rate)
+        self.buffers = [np.zeros(max_samples, dtype=np.float32) for _ in range(2)]
+        self.buffer = self.buffers[0]
+        self.length = 0
+        self.is_speaking = False
+        self.skipped_windows = 0  # Blocks taken as silence without running the model
+        self.model_stale = False  # The model missed skipped blocks and must be reset
+
+    def _write_pre_roll(self, block):
+        size = len(self.pre_roll)
+        n = len(block)
+        if n >= size:
+            self.pre_roll[:] = block[-size:]
+        else:
+            start = self.pre_roll_written % size
+            first = min(n, size - start)
+            self.pre_roll[start:start + first] = block[:first]
+            self.pre_roll[:n - first] = block[first:]
+        self.pre_roll_written += n
+
+    def _next_buffer(self):
+        self.buffer = self.buffers[1] if self.buffer is self.buffers[0] else self.buffers[0]
+        self.length = 0
+
+    def _start_utterance(self):
+        self._next_buffer()
+        size = len(self.pre_roll)
+        filled = min(self.pre_roll_written, size)
+        if filled < size:
+            self.buffer[:filled] = self.pre_roll[:filled]
+        else:
+            # Unroll the ring so the oldest sample comes first
+            start = self.pre_roll_written % size
+            self.buffer[:size - start] = self.pre_roll[start:]
+            self.buffer[size - start:size] = self.pre_roll[:start]
+        self.length = filled
+        self.is_speaking = True
+
+    def push(self, block, speech_dict=None):
+        """Feeds one block and its VAD event. Returns a finished utterance view, or None."""
+        utterance = None
+        if self.is_speaking:
+            if self.length + len(block) > len(self.buffer):
+                print("Maximum utterance length reached. Splitting utterance.")
+                utterance = self.buffer[:self.length]
+                self._next_buffer()
+            self.buffer[self.length:self.length + len(block)] = block
+            self.length += len(block)
+        self._write_pre_roll(block)
+
+        if speech_dict:
+            if 'start' in speech_dict and not self.is_speaking:
+                self._start_utterance()
+            elif 'end' in speech_dict and self.is_speaking:
+                self.is_speaking = False
+                # A split on the final block leaves only a short tail, which is dropped
+                if utterance is None:
+                    utterance = self.buffer[:self.length]
+        return utterance
+
+    def score(self, block, vad, catch_up: bool = False):
+        """Runs vad on one block and returns its start/end event, or None.
+
+        With catch_up, a block outside speech that is quieter than the noise floor is taken as
+        silence without running the model. Outside speech VADIterator reports nothing for such a
+        block anyway, so events are unchanged. Its sample clock still advances, and the model is
+        reset before the next block it scores, since the audio it remembers is no longer adjacent.
+        """
+        if catch_up and not vad.triggered and pcm_rms(block) < r.energy_threshold:
+            vad.current_sample += len(block)
+            self.skipped_windows += 1
+            self.model_stale = True
+            return None
+        if self.model_stale:
+            vad.model.reset_states()
+            self.model_stale = False
+        return vad(torch.from_numpy(block), return_seconds=True)
+
+    def utterances(self, blocks, vad, on_silence=None, behind=None):
+        """Yields finished utterances from an iterable of WINDOW_SIZE float32 blocks.
+
+        Each block is scored with vad. Blocks outside speech are also passed to on_silence,
+        e.g. to track the noise floor. While behind() returns True, quiet blocks are scored
+        in catch-up mode (see score()).
+        """
+        for block in blocks:
+            speech_dict = self.score(block, vad, catch_up=behind is not None and behind())
+            if on_silence and not self.is_speaking and not speech_dict:
+                on_silence(block)
+            if speech_dict and 'start' in speech_dict:
+                print("Speech Started")
+            utterance = self.push(block, speech_dict)
+            if utterance is not None:
+                yield utterance
+
 
 # Callback function for the audio stream
 def audio_callback(indata, frames, time_info, status):
     if status:
+        if status.input_overflow:
+            audio_buffer.overruns += 1
         print(f"Stream status: {status}", flush=True)
-    # Convert bytes to float32 tensor
-    audio_chunk = torch.from_numpy(indata[:, 0]).float()
-    audio_buffer.append(audio_chunk)
+    # sounddevice reuses indata, so keep a copy of the mono channel
+    audio_buffer.put(indata[:, 0].copy())
 
-def collect_recording(chunk):
-    """Collect recording and save it to a file."""
-    global collected_chunks
-    
-    if collected_chunks is None:
-        collected_chunks = chunk
-    else:
-        collected_chunks = torch.cat([collected_chunks, chunk], dim=0)
 
+def pcm_rms(samples):
+    """Returns the RMS energy of float samples in int16 units, as Recognizer uses."""
+    return float(np.sqrt(np.mean(np.square(samples, dtype=np.float32)))) * 32000
 
-# Function to process audio chunks
-def process_audio():
-    global start_time
-    global is_speaking
-    global collected_chunks
-    previous_chunk = None
-    is_saved = False
-    just_started_speaking = False
 
-    while True:
-        if len(audio_buffer) == 0:
-            sd.sleep(10)
-            continue
+def update_noise_floor(block):
+    """Tracks ambient noise from a non-speech block, like Recognizer.adjust_for_ambient_noise."""
+    seconds_per_buffer = len(block) / SAMPLING_RATE
+    damping = r.dynamic_energy_adjustment_damping ** seconds_per_buffer
+    target_energy = pcm_rms(block) * r.dynamic_energy_ratio
+    r.energy_threshold = r.energy_threshold * damping + target_energy * (1 - damping)
+
+
+class FakeRecognizer:
+    """Stand-in for sr.Recognizer that waits instead of calling a speech API. Useful for testing."""
+
+    def __init__(self, latency: float = 0.5):
+        self.latency = latency
+
+    def recognize_google(self, audio_data):
+        time.sleep(self.latency)
+        seconds = len(audio_data.frame_data) / (audio_data.sample_rate * audio_data.sample_width)
+        return f"<{seconds:.2f}s of speech>"
+
+
+class RecognitionWorker:
+    """Transcribes utterances on a thread pool and delivers results in submission order.
 
-        # Get the next audio chunk
-        audio_chunk = audio_buffer.popleft().to(DEVICE)
-
-        if just_started_speaking:
-            just_started_speaking = False
-            collect_recording(previous_chunk)
-        
-        if is_speaking:
-            is_saved = False
-            collect_recording(audio_chunk)
-
-        # Save the audio chunk to a file
-        sample_rate = 16000  # Replace with your actual sample rate
-        
-        if not is_speaking and collected_chunks is not None and not is_saved:
-            final_audio_data = collected_chunks.numpy()
-            final_audio_data = (final_audio_data * 32000).astype(np.int16)
-            write("output.wav", sample_rate, final_audio_data)
-            # recognize the audio using speech recognition library
+    Capture and VAD keep running while earlier utterances are still being transcribed.
+    """
+
+    def __init__(self, recognizer=r, workers: int = RECOGNITION_WORKERS, on_result=None):
+        self.recognizer = recognizer
+        self.on_result = on_result or (lambda text: print(f"Recognized text: {text}"))
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="recognizer")
+        self.pending = queue.Queue()
+        self.delivery = threading.Thread(target=self._deliver, daemon=True)
+        self.delivery.start()
+
+    def submit(self, utterance):
+        """Converts the utterance to int16 PCM and queues it for recognition."""
+        if pcm_rms(utterance) < r.energy_threshold:
+            print("Utterance is below the ambient noise floor. Skipping.")
+            return
+        # astype makes a copy, so the capture buffer behind the view can be reused
+        final_audio_data = (utterance * 32000).astype(np.int16)
+        audio_data = sr.AudioData(final_audio_data.tobytes(), SAMPLING_RATE, 2)
+        self.pending.put(self.pool.submit(self.recognizer.recognize_google, audio_data))
+
+    def _deliver(self):
+        # Waiting on futures in submission order keeps results ordered
+        while True:
+            future = self.pending.get()
+            if future is None:
+                break
             try:
-                with sr.AudioFile("output.wav") as source:
-                    r.adjust_for_ambient_noise(source)
-                    audio_data = r.record(source)
-                    text = r.recognize_google(audio_data)
-                    collected_chunks = None
-                    print(f"Recognized text: {text}")
+                self.on_result(future.result())
             except Exception as e:
                 print(f"Error recognizing audio: {e}")
-                pass
-            is_saved = True
 
-        if previous_chunk is None:
-            previous_chunk = audio_chunk
-        else:
-            previous_chunk = torch.cat([previous_chunk[-8000:], audio_chunk], dim=0)
+    def close(self):
+        """Waits for queued utterances to finish and stops the workers."""
+        self.pending.put(None)
+        self.delivery.join()
+        self.pool.shutdown()
 
-        # VAD processing
-        speech_dict = vad_iterator(audio_chunk, return_seconds=True)
 
-        if speech_dict:
-            if speech_dict.get('start'):
-                print("Speech Started")
-                is_speaking = True
-                just_started_speaking = True
-            # Use .get() method to safely retrieve values with a default
-            start_time = speech_dict.get('start', start_time)
-            end_time = speech_dict.get('end', None)
-            
-            # Check if both start and end times are available
-            if start_time is not None and end_time is not None:
-                is_speaking = False
-                print(f"Speech detected from {start_time:.2f}s to {end_time:.2f}s")
+def live_blocks():
+    """Yields microphone blocks as they arrive, reporting when blocks had to be dropped."""
+    reported_drops = 0
+    while True:
+        block = audio_buffer.get(timeout=1.0)
+        if block is None:
+            continue
+        if audio_buffer.dropped != reported_drops:
+            reported_drops = audio_buffer.dropped
+            print(f"Falling behind real time: {audio_buffer.stats()}")
+        yield block
+
+
+# Function to process audio chunks
+def process_audio(worker, capture, max_lag_ms: float = MAX_VAD_LAG_MS):
+    def behind():
+        return audio_buffer.lag_ms() > max_lag_ms
+
+    for utterance in capture.utterances(live_blocks(), vad_iterator, on_silence=update_noise_floor, behind=behind):
+        print(f"Speech detected: {len(utterance) / SAMPLING_RATE:.2f}s")
+        worker.submit(utterance)
+
+
+def load_wav(path):
+    """Loads a WAV file as mono float32 at SAMPLING_RATE."""
+    rate, data = read(path)
+    if np.issubdtype(data.dtype, np.integer):
+        data = data.astype(np.float32) / np.iinfo(data.dtype).max
+    if data.ndim > 1:
+        data = data.mean(axis=1)
+    data = np.ascontiguousarray(data, dtype=np.float32)
+    if rate != SAMPLING_RATE:
+        data = torchaudio.functional.resample(
+            torch.from_numpy(data), rate, SAMPLING_RATE).numpy()
+    return data
+
+
+def benchmark(path, worker=None, catch_up=False):
+    """Replays a WAV file through the capture pipeline and reports per-block CPU time.
+
+    With a worker, finished utterances are also submitted for recognition. With catch_up,
+    every block is scored as if the consumer were behind, to show what catch-up saves.
+    """
+    audio = load_wav(path)
+    n_blocks = len(audio) // WINDOW_SIZE
+    blocks = audio[:n_blocks * WINDOW_SIZE].reshape(n_blocks, WINDOW_SIZE)
+    capture = UtteranceCapture()
+    vad = VADIterator(model, sampling_rate=SAMPLING_RATE)
+    vad_ns = np.zeros(n_blocks, dtype=np.int64)
+    capture_ns = np.zeros(n_blocks, dtype=np.int64)
+    utterance_seconds = []
+
+    cpu_start = time.process_time()
+    for i, block in enumerate(blocks):
+        t0 = time.thread_time_ns()
+        speech_dict = capture.score(block, vad, catch_up)
+        t1 = time.thread_time_ns()
+        utterance = capture.push(block, speech_dict)
+        if utterance is not None:
+            utterance_seconds.append(len(utterance) / SAMPLING_RATE)
+            if worker:
+                worker.submit(utterance)
+        t2 = time.thread_time_ns()
+        vad_ns[i] = t1 - t0
+        capture_ns[i] = t2 - t1
+    cpu_total = time.process_time() - cpu_start
+
+    block_ms = WINDOW_SIZE / SAMPLING_RATE * 1000
+    print(f"Replayed {len(audio) / SAMPLING_RATE:.1f}s of audio in {n_blocks} blocks of {block_ms:.0f}ms")
+    print(f"Utterances: {len(utterance_seconds)} ({', '.join(f'{s:.2f}s' for s in utterance_seconds)})")
+    if catch_up:
+        print(f"Catch-up skipped the model for {capture.skipped_windows} of {n_blocks} blocks")
+    for name, samples in (("VAD", vad_ns), ("Capture", capture_ns), ("Total", vad_ns + capture_ns)):
+        us = samples / 1000
+        print(f"{name:>8} per block: mean {us.mean():.1f}us, p50 {np.percentile(us, 50):.1f}us, "
+              f"p95 {np.percentile(us, 95):.1f}us, max {us.max():.1f}us")
+    print(f"CPU time: {cpu_total:.3f}s, {cpu_total * 1000 / max(n_blocks, 1):.3f}ms per block "
+          f"({cpu_total * 1000 / max(n_blocks, 1) / block_ms * 100:.1f}% of real time)")
 
 
 # Start the audio stream
 def main():
+    parser = argparse.ArgumentParser(description="Real-time VAD gated speech recognition.")
+    parser.add_argument("--bench", metavar="WAV", help="replay a WAV file through the capture pipeline and report timings")
+    parser.add_argument("--fake-latency", type=float, metavar="SECONDS",
+                        help="use a fake recognizer with this latency instead of Google speech recognition")
+    parser.add_argument("--max-lag-ms", type=float, default=MAX_VAD_LAG_MS,
+                        help="queued audio above which quiet blocks skip VAD so processing catches up")
+    parser.add_argument("--catch-up", action="store_true",
+                        help="with --bench, score every block in catch-up mode")
+    args = parser.parse_args()
+
+    recognizer = FakeRecognizer(args.fake_latency) if args.fake_latency is not None else r
+
+    if args.bench:
+        worker = RecognitionWorker(recognizer) if args.fake_latency is not None else None
+        benchmark(args.bench, worker, args.catch_up)
+        if worker:
+            worker.close()
+        return
+
+    worker = RecognitionWorker(recognizer)
+    capture = UtteranceCapture()
     print("Starting real-time VAD. Press Ctrl+C to stop.")
     try:
         with sd.InputStream(channels=1,
                             samplerate=SAMPLING_RATE,
                             blocksize=WINDOW_SIZE,
+                            dtype='float32',
                             callback=audio_callback):
-            process_audio()
+            process_audio(worker, capture, args.max_lag_ms)
     except KeyboardInterrupt:
         print("\nReal-time VAD stopped.")
+        print(f"Audio {audio_buffer.stats()}, VAD skipped for {capture.skipped_windows} quiet blocks")
     except Exception as e:
         print(f"Error: {e}")
+    finally:
+        worker.close()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()